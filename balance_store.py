@@ -0,0 +1,287 @@
+import argparse
+import json
+import math
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta, timezone
+from dotenv import load_dotenv
+
+# Local history of every run's balances in SQLite (WAL mode).
+# - runs: one row per run, as extracted, with source metadata.
+# - daily: one row per business date (the latest run that day wins) with the
+#   day-over-day delta, 7/30-day moving averages and anomaly flags of the net float
+#   (the configured reconciliation, CIMB - (V2 + VAS) by default). Window sums are
+#   carried forward from the previous day's row, so recording a day touches only the
+#   rows that enter or leave the windows.
+# Every source's balance is kept in the balances JSON column; cimb/v2/vas stay as
+# plain columns for existing queries.
+# Usage: python balance_store.py shortfall --days 90 | history --days 30 | rebuild
+
+load_dotenv()
+BALANCE_STORE_PATH = os.getenv("BALANCE_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "balances.db"))
+ANOMALY_Z = float(os.getenv("BALANCE_ANOMALY_Z", "3"))  # Net this many 30-day std devs from the 30-day mean is flagged
+ANOMALY_MIN_DAYS = 7  # History needed before the z-score check applies
+LEGACY_SOURCES = ("CIMB", "V2", "VAS")  # Sources with their own column
+WINDOWS = (7, 30)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT,
+    recorded_at TEXT NOT NULL,
+    business_date TEXT NOT NULL,
+    cimb REAL,
+    v2 REAL,
+    vas REAL,
+    net REAL,
+    metadata TEXT,
+    balances TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_business_date ON runs (business_date);
+CREATE TABLE IF NOT EXISTS daily (
+    business_date TEXT PRIMARY KEY,
+    run_id TEXT,
+    recorded_at TEXT NOT NULL,
+    cimb REAL,
+    v2 REAL,
+    vas REAL,
+    net REAL,
+    delta REAL,
+    sum7 REAL NOT NULL DEFAULT 0,
+    n7 INTEGER NOT NULL DEFAULT 0,
+    sum30 REAL NOT NULL DEFAULT 0,
+    sumsq30 REAL NOT NULL DEFAULT 0,
+    n30 INTEGER NOT NULL DEFAULT 0,
+    ma7 REAL,
+    ma30 REAL,
+    std30 REAL,
+    flags TEXT NOT NULL DEFAULT '',
+    balances TEXT
+) WITHOUT ROWID;
+"""
+
+_write_lock = threading.Lock()
+
+def connect(path=None):
+    path = path or BALANCE_STORE_PATH
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    for table in ("runs", "daily"):
+        # Databases created before the balances column existed
+        columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if "balances" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN balances TEXT")
+    return conn
+
+def net_float(balances):
+    # The configured reconciliation (CIMB - (V2 + VAS) by default), or None if a balance it needs is missing
+    from extractors import get_registry
+    return get_registry().reconciliation.evaluate(balances)
+
+def row_balances(row):
+    # {source: balance} of a runs/daily row; rows written before the balances column have only cimb/v2/vas
+    if row["balances"]:
+        return json.loads(row["balances"])
+    return {source: row[source.lower()] for source in LEGACY_SOURCES}
+
+def _window_leaving(conn, previous_date, business_date, days):
+    # Net values of the days that drop out of a `days` window when it moves from previous_date to business_date
+    start = (date.fromisoformat(previous_date) - timedelta(days=days - 1)).isoformat()
+    end = (date.fromisoformat(business_date) - timedelta(days=days - 1)).isoformat()
+    rows = conn.execute(
+        "SELECT net FROM daily WHERE business_date >= ? AND business_date < ? AND net IS NOT NULL",
+        (start, end),
+    ).fetchall()
+    return [row["net"] for row in rows]
+
+def _derive(conn, business_date, values, previous):
+    # Delta, window sums, moving averages and flags for one day, from the previous day's row
+    net = values["net"]
+    derived = {"delta": None, "sum7": 0.0, "n7": 0, "sum30": 0.0, "sumsq30": 0.0, "n30": 0}
+    flags = []
+    if previous is not None:
+        for key in ("sum7", "n7", "sum30", "sumsq30", "n30"):
+            derived[key] = previous[key]
+        for days in WINDOWS:
+            leaving = _window_leaving(conn, previous["business_date"], business_date, days)
+            derived[f"sum{days}"] -= sum(leaving)
+            derived[f"n{days}"] -= len(leaving)
+            if days == 30:
+                derived["sumsq30"] -= sum(value * value for value in leaving)
+        if net is not None and previous["net"] is not None:
+            derived["delta"] = net - previous["net"]
+    # The z-score compares today against the 30 days before it
+    mean_before, std_before, n_before = _mean_std(derived["sum30"], derived["sumsq30"], derived["n30"])
+    if net is not None:
+        for days in WINDOWS:
+            derived[f"sum{days}"] += net
+            derived[f"n{days}"] += 1
+        derived["sumsq30"] += net * net
+        if net < 0:
+            flags.append("shortfall")
+            if previous is None or previous["net"] is None or previous["net"] >= 0:
+                flags.append("new_shortfall")
+        if n_before >= ANOMALY_MIN_DAYS and std_before and abs(net - mean_before) > ANOMALY_Z * std_before:
+            flags.append("outlier")
+    else:
+        missing = [source for source, value in json.loads(values["balances"]).items() if value is None]
+        flags.append("missing:" + ",".join(missing) if missing else "no_net")
+    derived["ma7"] = derived["sum7"] / derived["n7"] if derived["n7"] else None
+    derived["ma30"], derived["std30"], _ = _mean_std(derived["sum30"], derived["sumsq30"], derived["n30"])
+    derived["flags"] = " ".join(flags)
+    return derived
+
+def _mean_std(total, total_sq, count):
+    if not count:
+        return None, None, 0
+    mean = total / count
+    # Running sums drift slightly; clamp so rounding never gives a negative variance
+    variance = max(0.0, total_sq / count - mean * mean)
+    return mean, math.sqrt(variance), count
+
+def _previous_day(conn, business_date):
+    return conn.execute(
+        "SELECT * FROM daily WHERE business_date < ? ORDER BY business_date DESC LIMIT 1", (business_date,)
+    ).fetchone()
+
+def _write_day(conn, business_date, values):
+    derived = _derive(conn, business_date, values, _previous_day(conn, business_date))
+    row = {"business_date": business_date, **values, **derived}
+    columns = ", ".join(row)
+    placeholders = ", ".join(f":{key}" for key in row)
+    conn.execute(f"INSERT OR REPLACE INTO daily ({columns}) VALUES ({placeholders})", row)
+    return row
+
+def _day_values(run_row):
+    values = {key: run_row[key] for key in ("run_id", "recorded_at", "cimb", "v2", "vas", "net")}
+    values["balances"] = json.dumps(row_balances(run_row))
+    return values
+
+def record_run(balances, business_date, run_id=None, metadata=None, path=None):
+    # Appends the run and updates that business date's daily row; returns the daily row as a dict
+    business_date = business_date.isoformat() if isinstance(business_date, date) else business_date
+    values = {
+        "run_id": run_id,
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "cimb": balances.get("CIMB"),
+        "v2": balances.get("V2"),
+        "vas": balances.get("VAS"),
+        "net": net_float(balances),
+        "balances": json.dumps(balances),
+    }
+    with _write_lock:
+        conn = connect(path)
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO runs (run_id, recorded_at, business_date, cimb, v2, vas, net, metadata, balances) "
+                    "VALUES (:run_id, :recorded_at, :business_date, :cimb, :v2, :vas, :net, :metadata, :balances)",
+                    {**values, "business_date": business_date, "metadata": json.dumps(metadata or {}, default=str)},
+                )
+                row = _write_day(conn, business_date, values)
+                # A back-filled day shifts the windows of every later day, so those are carried forward again
+                later = conn.execute(
+                    "SELECT * FROM daily WHERE business_date > ? ORDER BY business_date", (business_date,)
+                ).fetchall()
+                for later_row in later:
+                    _write_day(conn, later_row["business_date"], _day_values(later_row))
+            return row
+        finally:
+            conn.close()
+
+def rebuild(path=None):
+    # Recomputes the daily table from the runs table (e.g. after changing ANOMALY_Z or the reconciliation)
+    with _write_lock:
+        conn = connect(path)
+        try:
+            with conn:
+                conn.execute("DELETE FROM daily")
+                latest = conn.execute(
+                    "SELECT * FROM runs WHERE id IN (SELECT MAX(id) FROM runs GROUP BY business_date) ORDER BY business_date"
+                ).fetchall()
+                for run_row in latest:
+                    values = _day_values(run_row)
+                    values["net"] = net_float(json.loads(values["balances"]))
+                    _write_day(conn, run_row["business_date"], values)
+            return len(latest)
+        finally:
+            conn.close()
+
+def history(start=None, end=None, path=None):
+    # Daily rows between start and end (inclusive ISO dates), oldest first
+    conn = connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT * FROM daily WHERE business_date >= ? AND business_date <= ? ORDER BY business_date",
+            (start or "0000-00-00", end or "9999-99-99"),
+        ).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+def previous_day(business_date, path=None):
+    conn = connect(path)
+    try:
+        row = _previous_day(conn, business_date.isoformat() if isinstance(business_date, date) else business_date)
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+def shortfall_summary(start=None, end=None, path=None):
+    # Days with a negative net float in the range, the worst one and the total shortfall
+    conn = connect(path)
+    try:
+        bounds = (start or "0000-00-00", end or "9999-99-99")
+        totals = conn.execute(
+            "SELECT COUNT(*) AS days, SUM(net < 0) AS shortfall_days, MIN(net) AS worst_net, "
+            "SUM(CASE WHEN net < 0 THEN -net ELSE 0 END) AS total_shortfall, AVG(net) AS average_net "
+            "FROM daily WHERE business_date >= ? AND business_date <= ? AND net IS NOT NULL",
+            bounds,
+        ).fetchone()
+        worst = conn.execute(
+            "SELECT business_date FROM daily WHERE business_date >= ? AND business_date <= ? AND net < 0 "
+            "ORDER BY net LIMIT 1",
+            bounds,
+        ).fetchone()
+        summary = dict(totals)
+        summary["shortfall_days"] = summary["shortfall_days"] or 0
+        summary["worst_date"] = worst["business_date"] if worst else None
+        return summary
+    finally:
+        conn.close()
+
+def _since(days):
+    return (date.today() - timedelta(days=days)).isoformat()
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the local balance history")
+    parser.add_argument("--db", default=None, help=f"database path (default {BALANCE_STORE_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("shortfall", "history"):
+        command = commands.add_parser(name)
+        command.add_argument("--days", type=int, default=90)
+        command.add_argument("--since", help="start date, YYYY-MM-DD (overrides --days)")
+        command.add_argument("--until", help="end date, YYYY-MM-DD")
+    commands.add_parser("rebuild")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        print(f"Rebuilt {rebuild(args.db)} day(s).")
+        return
+    start = args.since or _since(args.days)
+    if args.command == "shortfall":
+        print(json.dumps(shortfall_summary(start, args.until, args.db), indent=2))
+        return
+    print(f"{'date':<12}{'net':>16}{'delta':>14}{'7d avg':>16}{'30d avg':>16}  flags")
+    for row in history(start, args.until, args.db):
+        fmt = lambda value: "-" if value is None else f"{value:,.2f}"
+        print(f"{row['business_date']:<12}{fmt(row['net']):>16}{fmt(row['delta']):>14}{fmt(row['ma7']):>16}{fmt(row['ma30']):>16}  {row['flags']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import os
+import sys
+
+# Helpers shared by the benchmark scripts
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def peak_rss_mb():
+    # Peak resident set size of this process in MB
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS reports bytes
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        import psutil  # Windows has no resource module
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+def current_rss_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+def _proc_children():
+    # ppid -> [pid] from /proc, for hosts without psutil
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+def tree_rss_mb():
+    # RSS of this process plus all descendants (chromedriver, Chrome renderers) in MB
+    try:
+        import psutil
+        process = psutil.Process()
+        total = 0
+        for proc in [process] + process.children(recursive=True):
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / (1024 * 1024)
+    except ImportError:
+        children = _proc_children()
+        pending, total = [os.getpid()], 0
+        while pending:
+            pid = pending.pop()
+            pending.extend(children.get(pid, []))
+            try:
+                with open(f"/proc/{pid}/statm") as f:
+                    total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            except OSError:
+                pass
+        return total / (1024 * 1024)
+
+def chrome_process_count():
+    # Chrome and chromedriver processes on the host, to spot browsers left behind
+    names = ("chrome", "chromium", "chromedriver")
+    try:
+        import psutil
+        return sum(1 for proc in psutil.process_iter(["name"]) if any(n in (proc.info["name"] or "").lower() for n in names))
+    except ImportError:
+        count = 0
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/comm") as f:
+                    name = f.read().strip().lower()
+            except OSError:
+                continue
+            count += any(n in name for n in names)
+        return count
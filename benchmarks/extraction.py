@@ -0,0 +1,161 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from benchmarks.common import REPO_ROOT, tree_rss_mb, chrome_process_count
+from benchmarks.fixture_server import FixtureServer, parse_per_source
+
+# End-to-end extraction against the local fixture portals: wall time, peak RSS of the
+# process tree (Python + chromedriver + Chrome) and Chrome processes left behind.
+# Each result is also checked against the balance the fixture served, so the same
+# run doubles as a regression check. Exits non-zero on a wrong or missing balance.
+# Usage: python -m benchmarks.extraction [--cases v2-http,cimb] [--repeat 3] [--latency 0.2] [--json]
+
+# case -> (module, function, fixture balance it must return)
+CASES = {
+    "v2-http": ("http_extractors", "fetch_v2_balance", "V2"),
+    "vas-http": ("http_extractors", "fetch_vas_balance", "VAS"),
+    "v2": ("main", "login_and_test_v2", "V2"),
+    "vas": ("main2", "login_vas", "VAS"),
+    "cimb": ("main3", "login_and_get_cimb_balance", "CIMB"),
+    "report": ("generate_report", "run_report", None),
+}
+# Keyword arguments per case; the report re-scrapes every portal instead of reading the result cache
+CASE_KWARGS = {"report": {"force_refresh": True}}
+
+class PeakSampler:
+    # Samples process-tree RSS in the background; Chrome lives in child processes
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, tree_rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, tree_rss_mb())
+
+def _expected(server, source):
+    if source == "CIMB":
+        from benchmarks.fixture_server import CIMB_ACCOUNT
+        return server.state.cimb_accounts[CIMB_ACCOUNT]
+    return server.state.balances[source]
+
+def run_case(name, server, quiet=True):
+    module_name, function_name, source = CASES[name]
+    func = getattr(importlib.import_module(module_name), function_name)
+    requests_before = dict(server.state.requests)
+    logins_before = dict(server.state.logins)
+    chrome_before = chrome_process_count()
+    output = io.StringIO()
+    error = None
+    with PeakSampler() as sampler:
+        started = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+                value = func(**CASE_KWARGS.get(name, {}))
+        except Exception as e:
+            value, error = None, f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - started
+    result = {
+        "case": name,
+        "wall_s": round(elapsed, 3),
+        "peak_rss_mb": round(sampler.peak, 1),
+        "chrome_before": chrome_before,
+        "chrome_after": chrome_process_count(),
+        "requests": sum(server.state.requests.values()) - sum(requests_before.values()),
+        "logins": sum(server.state.logins.values()) - sum(logins_before.values()),
+    }
+    if source is not None:
+        expected = _expected(server, source)
+        result["value"] = value
+        result["ok"] = value is not None and abs(float(value) - expected) < 0.005
+        if not result["ok"]:
+            result["error"] = error or f"expected {expected}, got {value}"
+            result["output"] = output.getvalue()[-2000:]
+    else:
+        result["ok"] = error is None
+        if error:
+            result["error"] = error
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the extractors against the local fixture portals")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"comma-separated, from: {', '.join(CASES)}")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--latency", default="", help="seconds per request, e.g. 'vas=0.5,cimb=1' or '0.2'")
+    parser.add_argument("--fail-rate", default="", help="share of page requests answered with 503, e.g. 'cimb=0.2'")
+    parser.add_argument("--vas-extra-rows", type=int, default=0)
+    parser.add_argument("--send-email", action="store_true", help="let the report case really send its email")
+    parser.add_argument("--verbose", action="store_true", help="show extractor output")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    cases = [case.strip() for case in args.cases.split(",") if case.strip()]
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    server = FixtureServer(
+        latency=parse_per_source(args.latency), failure_rate=parse_per_source(args.fail_rate),
+        vas_extra_rows=args.vas_extra_rows, seed=1,
+    ).start()
+    workdir = tempfile.mkdtemp(prefix="float-bench-")
+    # The extractors read their settings at import time, so the environment is set first
+    os.environ.update(server.env())
+    os.environ.setdefault("RUN_LOG_PATH", os.path.join(workdir, "run_log.jsonl"))
+    os.environ.setdefault("EXTRACT_RETRY_DELAY", "1")
+    os.environ.setdefault("DOWNLOADS_DIR", os.path.join(workdir, "downloads"))
+    # The report case records balances and may queue mail; never into the production store or outbox
+    os.environ["BALANCE_STORE_PATH"] = os.path.join(workdir, "balances.db")
+    os.environ["MAIL_OUTBOX_DIR"] = os.path.join(workdir, "outbox")
+    os.environ["RESULT_CACHE_DIR"] = os.path.join(workdir, "result_cache")
+    os.environ["SESSION_CACHE_DIR"] = os.path.join(workdir, "session_cache")
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+    if "report" in cases and not args.send_email:
+        import generate_report
+        generate_report.send_email = lambda subject, *args, **kwargs: print(f"(benchmark) email not sent: {subject}")
+
+    chrome_start = chrome_process_count()
+    results = []
+    try:
+        for _ in range(args.repeat):
+            for case in cases:
+                results.append(run_case(case, server, quiet=not args.verbose))
+    finally:
+        if "driver_pool" in sys.modules:
+            sys.modules["driver_pool"].get_pool().shutdown()
+        server.stop()
+    leaked = chrome_process_count() - chrome_start
+
+    if args.json:
+        print(json.dumps({"results": results, "chrome_leaked": leaked, "run_log": os.environ["RUN_LOG_PATH"]}, indent=2))
+    else:
+        print(f"{'case':<10}{'wall s':>9}{'peak MB':>10}{'chrome':>10}{'requests':>10}{'logins':>8}  result")
+        for r in results:
+            status = "ok" if r["ok"] else f"FAIL {r.get('error', '')}"
+            chrome = f"{r['chrome_before']}->{r['chrome_after']}"
+            print(f"{r['case']:<10}{r['wall_s']:>9}{r['peak_rss_mb']:>10}{chrome:>10}{r['requests']:>10}{r['logins']:>8}  {status}")
+        print(f"Chrome processes left after shutdown: {leaked}")
+        print(f"Stage timings: {os.environ['RUN_LOG_PATH']}")
+    if leaked > 0 or not all(r["ok"] for r in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
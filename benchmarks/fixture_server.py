@@ -0,0 +1,348 @@
+import argparse
+import io
+import os
+import random
+import secrets
+import threading
+import time
+from datetime import datetime
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from urllib.parse import urlsplit, parse_qs
+from benchmarks.common import REPO_ROOT
+
+# Local stand-ins for the V2, VAS and CIMB portals, served from one host so the
+# extractors can run offline (point V2_BASE_URL, VAS_BASE_URL and CIMB_BASE_URL at it).
+# The CIMB login page is the recorded cimb_login.html from the repo root; the other
+# pages are minimal copies of the structures the extractors rely on.
+# Latency and failures can be injected per portal.
+# Usage: python -m benchmarks.fixture_server [--port 8765] [--latency vas=0.5] [--fail-rate cimb=0.2]
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SOURCES = ("V2", "VAS", "CIMB")
+CIMB_ACCOUNT = "7013252356"
+VAS_BALANCE_ROW = 15  # Balance sits in B15, as in the real report
+_GIF = bytes.fromhex("47494638396101000100800000000000ffffff21f90401000000002c00000000010001000002024401003b")
+
+def _load(name, root=FIXTURES_DIR):
+    with open(os.path.join(root, name), encoding="utf-8") as f:
+        return f.read()
+
+def build_vas_report(business_date, balance, extra_rows=0):
+    # In-memory UserAcccountStatReport_YYYYMMDD.xlsx with the balance in B15
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Report"
+    ws["A1"] = "User Account Statistic Report"
+    ws["A2"] = f"Business Date: {business_date:%d/%m/%Y}"
+    for row in range(4, VAS_BALANCE_ROW):
+        ws.cell(row=row, column=1, value=f"Account group {row - 3}")
+        ws.cell(row=row, column=2, value=round(balance / 10 * (row % 3 + 1), 2))
+    ws.cell(row=VAS_BALANCE_ROW, column=1, value="Total Balance")
+    ws.cell(row=VAS_BALANCE_ROW, column=2, value=balance)
+    for offset in range(extra_rows):
+        row = VAS_BALANCE_ROW + 2 + offset
+        ws.cell(row=row, column=1, value=f"USER{offset:06d}")
+        ws.cell(row=row, column=2, value=round(offset * 1.37 % 5000, 2))
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def cimb_account_rows(accounts):
+    # Account Summary table rows, one balance link per account, as the portal renders them
+    return "\n".join(
+        f'    <tr><td>{account}</td><td>IPPS FLOAT ACCOUNT</td><td>Current</td><td>THB</td>'
+        f'<td align="right"><a href="#" onclick="onViewLastTransaction(\'{account}\', \'THB\')">{balance:,.2f}</a></td></tr>'
+        for account, balance in accounts.items()
+    )
+
+class FixtureState:
+    def __init__(self, latency=None, failure_rate=None, balances=None, cimb_accounts=None,
+                 vas_extra_rows=0, cimb_single_session=False, seed=None):
+        self.latency = {source: 0.0 for source in SOURCES}
+        self.latency.update({k.upper(): v for k, v in (latency or {}).items()})
+        self.failure_rate = {source: 0.0 for source in SOURCES}
+        self.failure_rate.update({k.upper(): v for k, v in (failure_rate or {}).items()})
+        self.balances = {"V2": 241.67, "VAS": 152340.5}
+        self.balances.update(balances or {})
+        self.cimb_accounts = cimb_accounts or {CIMB_ACCOUNT: 1250000.0, "7013252364": 98000.25}
+        self.vas_extra_rows = vas_extra_rows
+        self.cimb_single_session = cimb_single_session  # Real portal refuses a second login ("User is still login")
+        self.random = random.Random(seed)
+        self.sessions = {source: set() for source in SOURCES}
+        self.requests = {source: 0 for source in SOURCES}
+        self.logins = {source: 0 for source in SOURCES}
+        self.csrf_tokens = set()
+        self.lock = threading.Lock()
+        self.templates = {
+            name: Template(_load(name)) for name in os.listdir(FIXTURES_DIR) if name.endswith(".html")
+        }
+        self.cimb_login_page = _load("cimb_login.html", REPO_ROOT)
+        self.cimb_still_login_page = _load("cimb_dashboard.html", REPO_ROOT)
+        self.cimb_script = _load("cimb_combined.js")
+
+    def new_session(self, source):
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.sessions[source].add(token)
+            self.logins[source] += 1
+        return token
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    server_version = "FloatFixture/1.0"
+    state = None  # Set per server
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- helpers ---
+
+    def _source(self, path):
+        if path.startswith("/agents"):
+            return "V2"
+        if path.startswith("/vas-web"):
+            return "VAS"
+        return "CIMB"
+
+    def _cookies(self):
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        return {key: morsel.value for key, morsel in cookie.items()}
+
+    def _has_session(self, source):
+        token = self._cookies().get(f"{source.lower()}_session")
+        return token in self.state.sessions[source]
+
+    def _send(self, status, body=b"", content_type="text/html; charset=utf-8", headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _redirect(self, location, cookie=None):
+        headers = {"Location": location}
+        if cookie:
+            headers["Set-Cookie"] = cookie
+        self._send(302, b"", headers=headers)
+
+    def _page(self, name, **values):
+        self._send(200, self.state.templates[name].safe_substitute(**values))
+
+    def _form(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        data = parse_qs(self.rfile.read(length).decode("utf-8"), keep_blank_values=True)
+        return {key: values[0] for key, values in data.items()}
+
+    def _inject(self, source, static):
+        # Latency applies to every request; failures only to pages, not static assets
+        latency = self.state.latency[source]
+        if latency:
+            time.sleep(latency)
+        if not static and self.state.random.random() < self.state.failure_rate[source]:
+            self._send(503, "<html><body>Service Unavailable</body></html>")
+            return True
+        return False
+
+    # --- routing ---
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        path = url.path
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        source = self._source(path)
+        static = path.startswith("/common/") or ".pack" in path or "ruxitagentjs" in path
+        with self.state.lock:
+            self.state.requests[source] += 1
+        if self._inject(source, static):
+            return
+        handler = {"V2": self._v2, "VAS": self._vas, "CIMB": self._cimb}[source]
+        handler(method, path, query)
+
+    def _v2(self, method, path, query):
+        if path == "/agents/login" and method == "POST":
+            form = self._form()
+            valid_token = form.get("_token") in self.state.csrf_tokens
+            if valid_token and form.get("email") and form.get("password"):
+                token = self.state.new_session("V2")
+                return self._redirect("/agents/dashboard", f"v2_session={token}; Path=/; HttpOnly")
+            return self._redirect("/agents/login")
+        if path == "/agents/login":
+            if self._has_session("V2"):
+                return self._redirect("/agents/dashboard")
+            csrf_token = secrets.token_hex(8)
+            self.state.csrf_tokens.add(csrf_token)
+            return self._page("v2_login.html", csrf_token=csrf_token)
+        if path == "/agents/dashboard":
+            if not self._has_session("V2"):
+                return self._redirect("/agents/login")
+            return self._page("v2_dashboard.html", balance=f"{self.state.balances['V2']:,.2f}")
+        self._send(404, "Not Found")
+
+    def _vas(self, method, path, query):
+        if path == "/vas-web/auth/login" and method == "POST":
+            form = self._form()
+            if form.get("username") and form.get("password"):
+                token = self.state.new_session("VAS")
+                return self._redirect("/vas-web/home", f"vas_session={token}; Path=/; HttpOnly")
+            return self._redirect("/vas-web/auth/login")
+        if path == "/vas-web/auth/login":
+            return self._page("vas_login.html")
+        if not self._has_session("VAS"):
+            return self._redirect("/vas-web/auth/login")
+        if path == "/vas-web/home":
+            return self._page("vas_home.html")
+        if path.rstrip("/") == "/vas-web/report/amc_all_report":
+            rows = ""
+            if query.get("businessDate"):
+                business_date = datetime.strptime(query["businessDate"], "%d/%m/%Y")
+                filename = f"UserAcccountStatReport_{business_date:%Y%m%d}.xlsx"
+                rows = (
+                    f'    <tr><td>AmcAllReport_{business_date:%Y%m%d}.csv</td><td>{query["businessDate"]}</td>'
+                    f'<td><a href="/vas-web/report/download?file=AmcAllReport_{business_date:%Y%m%d}.csv"><i class="fa fa-file-o"></i></a></td></tr>\n'
+                    f'    <tr><td>{filename}</td><td>{query["businessDate"]}</td>'
+                    f'<td><a href="/vas-web/report/download?file={filename}"><i class="fa fa-file-o"></i></a></td></tr>'
+                )
+            return self._page("vas_report.html", rows=rows)
+        if path == "/vas-web/report/download":
+            filename = query.get("file", "")
+            if not filename.startswith("UserAcccountStatReport_"):
+                return self._send(200, "report,value\n", "text/csv", {"Content-Disposition": f'attachment; filename="{filename}"'})
+            business_date = datetime.strptime(filename.split("_")[1][:8], "%Y%m%d")
+            body = build_vas_report(business_date, self.state.balances["VAS"], self.state.vas_extra_rows)
+            return self._send(200, body, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                              {"Content-Disposition": f'attachment; filename="{filename}"'})
+        self._send(404, "Not Found")
+
+    def _cimb(self, method, path, query):
+        if path == "/corp/common2/login.do":
+            action = query.get("action", "loginRequest")
+            if action == "login" and method == "POST":
+                form = self._form()
+                if not (form.get("corpId") and form.get("userName") and form.get("passwordEncryption")):
+                    return self._send(200, self.state.cimb_login_page)
+                if self.state.cimb_single_session and self.state.sessions["CIMB"]:
+                    return self._send(200, self.state.cimb_still_login_page)
+                token = self.state.new_session("CIMB")
+                return self._redirect("/corp/front/returnMain.do", f"cimb_session={token}; Path=/; HttpOnly")
+            if action == "logout":
+                token = self._cookies().get("cimb_session")
+                with self.state.lock:
+                    self.state.sessions["CIMB"].discard(token)
+                return self._redirect("/corp/common2/login.do?action=loginRequest", "cimb_session=; Path=/; Max-Age=0")
+            return self._send(200, self.state.cimb_login_page)
+        if path.startswith("/corp/combined.js"):
+            return self._send(200, self.state.cimb_script, "application/javascript")
+        if path.startswith("/corp/combined.css") or path.endswith(".css"):
+            return self._send(200, "", "text/css")
+        if "ruxitagentjs" in path or path.startswith("/common/js/"):
+            return self._send(200, "", "application/javascript")
+        if path.startswith("/common/image/"):
+            return self._send(200, _GIF, "image/gif")
+        if not self._has_session("CIMB"):
+            return self._redirect("/corp/common2/login.do?action=loginRequest")
+        pages = {
+            "/corp/front/returnMain.do": ("cimb_main.html", {}),
+            "/corp/front/top.do": ("cimb_top.html", {"user": "BENCH USER"}),
+            "/corp/front/menu.do": ("cimb_menu.html", {}),
+            "/corp/front/welcome.do": ("cimb_welcome.html", {}),
+        }
+        if path in pages:
+            name, values = pages[path]
+            return self._page(name, **values)
+        if path == "/corp/front/accountsummary.do":
+            return self._page("cimb_account_summary.html", rows=cimb_account_rows(self.state.cimb_accounts))
+        self._send(404, "Not Found")
+
+class FixtureServer:
+    def __init__(self, host="127.0.0.1", port=0, **state_options):
+        self.state = FixtureState(**state_options)
+        handler = type("BoundFixtureHandler", (FixtureHandler,), {"state": self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        # Environment that points every extractor at this server
+        return {
+            "V2_BASE_URL": self.base_url,
+            "VAS_BASE_URL": self.base_url,
+            "CIMB_BASE_URL": self.base_url,
+            "V2_USERNAME": "bench@example.com", "V2_PASSWORD": "bench",
+            "VAS_USERNAME": "bench", "VAS_PASSWORD": "bench",
+            "CIMB_COMPANY_ID": "BENCH", "CIMB_USERNAME": "bench", "CIMB_PASSWORD": "bench",
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def parse_per_source(text):
+    # "vas=0.5,cimb=2" -> {"VAS": 0.5, "CIMB": 2.0}; a bare number applies to every portal
+    if not text:
+        return {}
+    values = {}
+    for part in text.split(","):
+        if "=" in part:
+            source, value = part.split("=", 1)
+            values[source.strip().upper()] = float(value)
+        else:
+            values.update({source: float(part) for source in SOURCES})
+    return values
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve offline stand-ins for the V2, VAS and CIMB portals")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="", help="seconds per request, e.g. 'vas=0.5,cimb=1' or '0.2'")
+    parser.add_argument("--fail-rate", default="", help="share of page requests answered with 503, e.g. 'cimb=0.2'")
+    parser.add_argument("--vas-extra-rows", type=int, default=0, help="filler rows after the balance in the VAS xlsx")
+    parser.add_argument("--cimb-single-session", action="store_true", help="refuse a second CIMB login until logout")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = FixtureServer(
+        args.host, args.port,
+        latency=parse_per_source(args.latency), failure_rate=parse_per_source(args.fail_rate),
+        vas_extra_rows=args.vas_extra_rows, cimb_single_session=args.cimb_single_session, seed=args.seed,
+    )
+    print(f"Fixture portals on {server.base_url}. Point the extractors at it with:")
+    for key, value in server.env().items():
+        print(f"  {key}={value}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+// Stand-in for /corp/combined.js.*.pack: just enough of the login page's script
+var checkLoad = "";
+function doLogin(form, event) {
+    if (event && event.keyCode == 13) { onLoginClick(); }
+}
+function onLoginClick() {
+    var form = document.forms["LoginActionForm"];
+    form.onsubmit = null;
+    form.action = loginRequest;
+    form.submit();
+}
+function onClearClick(form) { form.reset(); }
+function changeCountry(value) {}
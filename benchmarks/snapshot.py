@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import sys
+import time
+from benchmarks.common import REPO_ROOT
+from benchmarks.fixture_server import FIXTURES_DIR, CIMB_ACCOUNT, cimb_account_rows
+
+# CIMB snapshot parsing without a browser: the frameset, its frames and the recorded
+# "User is still login" page are parsed the way main3 parses a live DOM snapshot.
+# Reports the time per snapshot and checks every balance, the logout link and the
+# portal message come out right. Exits non-zero on a mismatch.
+# Usage: python -m benchmarks.snapshot [--accounts 200] [--repeat 500] [--json]
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def build_snapshot_pages(accounts):
+    # {frame name: html} of a logged-in frameset showing Account Summary
+    from string import Template
+    page = lambda name, **values: Template(_read(os.path.join(FIXTURES_DIR, name))).safe_substitute(**values)
+    return {
+        "_top": page("cimb_main.html"),
+        "topFrame": page("cimb_top.html", user="BENCH USER"),
+        "menuFrame": page("cimb_menu.html"),
+        "mainFrame": page("cimb_account_summary.html", rows=cimb_account_rows(accounts)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline CIMB snapshot parsing")
+    parser.add_argument("--accounts", type=int, default=2, help="accounts in the Account Summary table")
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    sys.path.insert(0, REPO_ROOT)
+    from cimb_snapshot import Frame, Snapshot
+
+    accounts = {CIMB_ACCOUNT: 1250000.0}
+    accounts.update({str(7013260000 + n): round(n * 1013.37 % 900000, 2) for n in range(1, max(1, args.accounts))})
+    pages = build_snapshot_pages(accounts)
+    still_login = _read(os.path.join(REPO_ROOT, "cimb_dashboard.html"))
+
+    def frameset():
+        frames = {name: Frame(name, f"/corp/front/{name}", html, ready="complete") for name, html in pages.items() if name != "_top"}
+        snapshot = Snapshot("/corp/front/returnMain.do", pages["_top"], frames)
+        _, logout = snapshot.logout_link()
+        return {"balances": snapshot.balances(), "logout": logout and logout["href"], "logged_in": snapshot.logged_in}
+
+    def login_refused():
+        snapshot = Snapshot("/corp/common2/login.do", still_login)
+        return {"messages": snapshot.messages, "logged_in": snapshot.logged_in}
+
+    cases = {
+        "frameset": (frameset, {"balances": accounts, "logout": "/corp/common2/login.do?action=logout", "logged_in": True}),
+        "still-login": (login_refused, {"messages": ["User is still login"], "logged_in": False}),
+    }
+    results = []
+    for name, (case, expected) in cases.items():
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            result = case()
+        elapsed = time.perf_counter() - started
+        results.append({"case": name, "ms_per_snapshot": elapsed / args.repeat * 1000, "ok": result == expected})
+
+    if args.json:
+        print(json.dumps({"accounts": len(accounts), "results": results}, indent=2))
+    else:
+        print(f"{'case':<14}{'ms/snapshot':>12}  result   ({len(accounts)} account(s), {args.repeat} runs)")
+        for result in results:
+            print(f"{result['case']:<14}{result['ms_per_snapshot']:>12.3f}  {'ok' if result['ok'] else 'MISMATCH'}")
+    if not all(result["ok"] for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
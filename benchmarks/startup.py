@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from benchmarks.common import REPO_ROOT
+
+# Import time and memory of the scheduler process.
+# Each case runs in a fresh interpreter so earlier imports don't skew the numbers.
+# Usage: python -m benchmarks.startup [--repeat 5] [--json]
+
+CASES = {
+    "python": "",
+    "scheduler idle": "import generate_report",
+    "scheduler + run path": (
+        "import generate_report, main, main2, main3, http_extractors, report_parser\n"
+        "import mailer, balance_store, result_cache, pytz"
+    ),
+}
+
+_PROBE = """
+import time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+from benchmarks.common import peak_rss_mb, current_rss_mb
+import json, sys
+print(json.dumps({{"import_s": elapsed, "rss_mb": current_rss_mb(), "peak_rss_mb": peak_rss_mb(), "modules": len(sys.modules)}}))
+"""
+
+def measure(code, repeat):
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(code=code)],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    best = min(samples, key=lambda s: s["import_s"])
+    return {
+        "import_ms": round(best["import_s"] * 1000, 1),
+        "rss_mb": round(best["rss_mb"], 1),
+        "peak_rss_mb": round(best["peak_rss_mb"], 1),
+        "modules": best["modules"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure scheduler import time and RSS")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in CASES.items():
+        try:
+            results[name] = measure(code, args.repeat)
+        except subprocess.CalledProcessError as e:
+            results[name] = {"error": e.stderr.strip().splitlines()[-1]}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'case':<24}{'import ms':>12}{'RSS MB':>10}{'peak MB':>10}{'modules':>10}")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<24}  {result['error']}")
+            continue
+        print(f"{name:<24}{result['import_ms']:>12}{result['rss_mb']:>10}{result['peak_rss_mb']:>10}{result['modules']:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import re
+from html.parser import HTMLParser
+
+# DOM snapshots of the CIMB BizChannel frameset.
+# One execute_script call returns the top document and every frame (topFrame,
+# menuFrame, mainFrame) as HTML; everything else - balance links, menu targets, the
+# logout link, portal messages such as "User is still login" - is parsed locally.
+# A read that used to take a frame switch and a WebDriver call per element becomes one
+# or two round trips, and the same parser runs offline on saved pages:
+#   python cimb_snapshot.py cimb_dashboard.html
+#   python cimb_snapshot.py --frame mainFrame=page.html --repeat 1000
+
+ACCOUNT_PATTERN = re.compile(r"onViewLastTransaction\(\s*'(\d+)'")
+MESSAGE_PATTERN = re.compile(r"^\s*Message\s*:\s*(.+?)\s*$", re.S)
+STALE_ATTRIBUTE = "data-float-stale"  # Set on a frame's document before it navigates away
+
+# Top document and every same-origin frame (nested framesets included) in one call.
+# arguments[0]: frame names whose HTML is wanted (null for all, top document included)
+SNAPSHOT_JS = """
+const wanted = arguments[0];
+const frames = {};
+function collect(win) {
+    for (let i = 0; i < win.frames.length; i++) {
+        const frame = win.frames[i];
+        let name = 'frame' + i;
+        try {
+            name = frame.name || name;
+            const doc = frame.document;
+            frames[name] = {
+                url: frame.location.href,
+                ready: doc.readyState,
+                stale: doc.documentElement.hasAttribute('%(stale)s'),
+                html: (!wanted || wanted.includes(name)) ? doc.documentElement.outerHTML : null,
+            };
+            collect(frame);
+        } catch (e) {
+            frames[name] = {url: null, ready: null, stale: false, html: null, error: String(e)};
+        }
+    }
+}
+collect(window);
+return {url: location.href, html: wanted ? null : document.documentElement.outerHTML, frames: frames};
+""" % {"stale": STALE_ATTRIBUTE}
+
+# Marks a frame's current document stale, then points the frame at a new URL
+NAVIGATE_FRAME_JS = """
+const frame = window.frames[arguments[0]];
+frame.document.documentElement.setAttribute('%(stale)s', '1');
+frame.location.href = arguments[1];
+""" % {"stale": STALE_ATTRIBUTE}
+
+class FrameParser(HTMLParser):
+    # Collects links (id, href, onclick, target, text), frame declarations and portal messages
+    def __init__(self):
+        super().__init__()
+        self.links = []
+        self.frames = []
+        self.messages = []
+        self.title = ""
+        self._link = None
+        self._skip = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in ("script", "style"):
+            self._skip += 1
+        elif tag == "title":
+            self._in_title = not self.title  # Only the document's first title
+        elif tag in ("frame", "iframe"):
+            self.frames.append({"name": attrs.get("name") or "", "src": attrs.get("src") or ""})
+        elif tag == "a":
+            self._link = {
+                "id": attrs.get("id") or "",
+                "href": attrs.get("href") or "",
+                "onclick": attrs.get("onclick") or "",
+                "target": attrs.get("target") or "",
+                "text": "",
+            }
+            self.links.append(self._link)
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip:
+            self._skip -= 1
+        elif tag == "title":
+            self._in_title = False
+        elif tag == "a":
+            self._link = None
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._in_title:
+            self.title += data.strip()
+        if self._link is not None:
+            self._link["text"] += data
+        match = MESSAGE_PATTERN.match(data)
+        if match and match.group(1).strip():
+            self.messages.append(" ".join(match.group(1).split()))
+
+def parse_html(html):
+    parser = FrameParser()
+    parser.feed(html or "")
+    parser.close()
+    for link in parser.links:
+        link["text"] = " ".join(link["text"].split())
+    return parser
+
+class Frame:
+    def __init__(self, name, url=None, html=None, ready=None, stale=False, error=None):
+        self.name = name
+        self.url = url
+        self.html = html
+        self.ready = ready
+        self.stale = stale
+        self.error = error
+        self._parsed = None
+
+    @property
+    def parsed(self):
+        # Parsed on first use, so frames nobody reads cost nothing
+        if self._parsed is None:
+            self._parsed = parse_html(self.html)
+        return self._parsed
+
+    @property
+    def loaded(self):
+        # The frame shows a new, fully loaded document
+        return self.html is not None and self.ready == "complete" and not self.stale
+
+    def link(self, link_id):
+        return next((link for link in self.parsed.links if link["id"] == link_id), None)
+
+    def balances(self):
+        # {account: available balance} from the Account Summary balance links
+        balances = {}
+        for link in self.parsed.links:
+            match = ACCOUNT_PATTERN.search(link["onclick"])
+            if not match:
+                continue
+            try:
+                balances[match.group(1)] = float(link["text"].replace(",", ""))
+            except ValueError:
+                continue
+        return balances
+
+class Snapshot:
+    def __init__(self, url=None, html=None, frames=None):
+        self.url = url
+        self.top = Frame("_top", url, html, ready="complete")
+        self.frames = frames or {}
+
+    @classmethod
+    def from_script(cls, result):
+        frames = {name: Frame(name, **values) for name, values in (result.get("frames") or {}).items()}
+        return cls(result.get("url"), result.get("html"), frames)
+
+    def frame(self, name):
+        return self.frames.get(name) or Frame(name)
+
+    def _documents(self):
+        return [self.top] + list(self.frames.values())
+
+    @property
+    def logged_in(self):
+        # The post-login frameset has a menu frame; the login page (and its messages) has none
+        return "menuFrame" in self.frames
+
+    @property
+    def messages(self):
+        # Portal messages on any document, e.g. "User is still login"
+        return [message for document in self._documents() if document.html for message in document.parsed.messages]
+
+    def logout_link(self):
+        for document in self._documents():
+            if not document.html:
+                continue
+            for link in document.parsed.links:
+                if "action=logout" in link["href"] or link["onclick"].strip() == "logout()":
+                    return document, link
+        return None, None
+
+    def balances(self, frame="mainFrame"):
+        return self.frame(frame).balances() if frame in self.frames else {}
+
+def take_snapshot(driver, frames=None):
+    # One round trip; driver must be on the top document (switch_to.default_content)
+    return Snapshot.from_script(driver.execute_script(SNAPSHOT_JS, list(frames) if frames else None))
+
+def navigate_frame(driver, frame, url):
+    driver.execute_script(NAVIGATE_FRAME_JS, frame, url)
+
+def load_snapshot(top_path=None, frame_paths=None):
+    # Offline snapshot from saved pages: top document plus {frame name: path}
+    def read(path):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read()
+    frames = {name: Frame(name, path, read(path), ready="complete") for name, path in (frame_paths or {}).items()}
+    return Snapshot(top_path, read(top_path) if top_path else None, frames)
+
+def main():
+    import argparse
+    import json
+    import time
+    parser = argparse.ArgumentParser(description="Parse saved CIMB pages the way a live snapshot is parsed")
+    parser.add_argument("top", nargs="?", help="saved top-level page, e.g. cimb_dashboard.html")
+    parser.add_argument("--frame", action="append", default=[], metavar="NAME=PATH", help="saved frame page")
+    parser.add_argument("--repeat", type=int, default=1, help="parse this many times and report the time per parse")
+    args = parser.parse_args()
+    frame_paths = dict(item.split("=", 1) for item in args.frame)
+    if not args.top and not frame_paths:
+        parser.error("give a saved page and/or --frame NAME=PATH")
+
+    started = time.perf_counter()
+    for _ in range(max(1, args.repeat)):
+        snapshot = load_snapshot(args.top, frame_paths)
+        balances = {name: frame.balances() for name, frame in snapshot.frames.items()}
+        _, logout = snapshot.logout_link()
+        messages = snapshot.messages
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "title": snapshot.top.parsed.title if args.top else None,
+        "frames": [frame["name"] for frame in snapshot.top.parsed.frames] if args.top else [],
+        "links": {name: len(document.parsed.links) for name, document in [("_top", snapshot.top)] + list(snapshot.frames.items()) if document.html},
+        "balances": balances,
+        "logout": logout,
+        "messages": messages,
+        "parse_ms": round(elapsed / max(1, args.repeat) * 1000, 3),
+    }, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
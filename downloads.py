@@ -0,0 +1,236 @@
+import contextvars
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Report files downloaded by the extractors (browser or HTTP).
+# Every run and source gets its own directory, downloads/<run id>/<source>/, so runs
+# that overlap never see or delete each other's files. The run id is bound once when
+# a run starts (bind_run) and travels with the context into the extractor workers. Completion is detected from
+# filesystem events (watchdog: inotify on Linux) instead of a once-a-second poll;
+# without watchdog installed it falls back to polling. Each finished file is checked
+# (non-empty, expected size, xlsx is a zip) and its SHA-256 recorded in the run's
+# manifest.jsonl. When the run ends, DOWNLOAD_POLICY decides what happens to it:
+#   delete  - remove the run's directory (default)
+#   archive - move verified files to downloads/archive/<YYYY-MM-DD>/<source>/
+#   keep    - leave everything in place
+# Archived days older than DOWNLOAD_ARCHIVE_DAYS and run directories left behind by a
+# crashed process (older than DOWNLOAD_STALE_HOURS) are pruned at the end of each run.
+
+load_dotenv()
+DOWNLOADS_DIR = os.getenv("DOWNLOADS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "downloads"))
+DOWNLOAD_POLICY = os.getenv("DOWNLOAD_POLICY", "delete").lower()
+DOWNLOAD_ARCHIVE_DIR = os.getenv("DOWNLOAD_ARCHIVE_DIR", os.path.join(DOWNLOADS_DIR, "archive"))
+DOWNLOAD_ARCHIVE_DAYS = float(os.getenv("DOWNLOAD_ARCHIVE_DAYS", "90"))
+DOWNLOAD_STALE_HOURS = float(os.getenv("DOWNLOAD_STALE_HOURS", "24"))
+POLL_INTERVAL = 1.0  # Without watchdog
+EVENT_SAFETY_INTERVAL = 5.0  # Re-check this often even with events, in case one is missed
+POLICIES = ("delete", "archive", "keep")
+PARTIAL_SUFFIXES = (".crdownload", ".part", ".tmp")
+MANIFEST = "manifest.jsonl"
+
+_manifest_lock = threading.Lock()
+_bound_run_id = contextvars.ContextVar("download_run_id", default=None)
+
+class DownloadError(Exception):
+    pass
+
+def bind_run(run_id):
+    # Downloads made in this context, and in worker contexts copied from it, go under run_id
+    _bound_run_id.set(run_id)
+
+def _run_id(run_id=None):
+    run_id = run_id or _bound_run_id.get()
+    if run_id:
+        return run_id
+    # Ad-hoc calls (e.g. python main2.py) outside a report run
+    return f"adhoc-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+def run_dir(source, run_id=None):
+    # Creates and returns the download directory for this run and source
+    path = os.path.join(DOWNLOADS_DIR, _run_id(run_id), source)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _complete(path):
+    # The file is there and the browser has no partial download left for it
+    if not os.path.exists(path):
+        return False
+    return not any(os.path.exists(path + suffix) for suffix in PARTIAL_SUFFIXES)
+
+def _watch(directory, changed):
+    # Sets `changed` on any event in directory; returns the observer, or None without watchdog
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            changed.set()
+
+    observer = Observer()
+    observer.schedule(Handler(), directory, recursive=False)
+    observer.daemon = True
+    try:
+        observer.start()
+    except OSError as e:
+        # Out of inotify watches and the like
+        print(f"Filesystem events unavailable ({e}); polling for downloads.")
+        return None
+    return observer
+
+def wait_for_files(directory, filenames, timeout):
+    # Waits until every file in filenames has finished downloading into directory, or timeout.
+    # Returns {filename: path, or None if it did not finish in time}.
+    pending = {filename: os.path.join(directory, filename) for filename in filenames}
+    done = {}
+    changed = threading.Event()
+    os.makedirs(directory, exist_ok=True)
+    observer = _watch(directory, changed)
+    interval = EVENT_SAFETY_INTERVAL if observer is not None else POLL_INTERVAL
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            # Cleared before checking, so an event that lands during the check wakes the next wait
+            changed.clear()
+            for filename, path in list(pending.items()):
+                if _complete(path):
+                    done[filename] = path
+                    del pending[filename]
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0:
+                break
+            changed.wait(min(remaining, interval))
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join(timeout=5)
+    return {filename: done.get(filename) for filename in filenames}
+
+def wait_for_file(directory, filename, timeout):
+    path = wait_for_files(directory, [filename], timeout)[filename]
+    if path is None:
+        raise TimeoutError(f"{filename} did not finish downloading within {timeout}s")
+    return path
+
+def sha256_of(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def verify(path, source=None, business_date=None, expected_size=None, expected_sha256=None):
+    # Checks a finished download and records it in the manifest; returns its manifest entry.
+    # A file that fails is renamed to <name>.invalid, so it is never read as a report, and DownloadError raised.
+    size = os.path.getsize(path)
+    checksum = sha256_of(path)
+    problem = None
+    if size == 0:
+        problem = "file is empty"
+    elif expected_size is not None and size != expected_size:
+        problem = f"size {size} does not match the expected {expected_size}"
+    elif expected_sha256 is not None and checksum != expected_sha256:
+        problem = "checksum does not match"
+    elif path.lower().endswith(".xlsx"):
+        with open(path, "rb") as f:
+            if f.read(4) != b"PK\x03\x04":
+                problem = "not an xlsx workbook (an error page?)"
+    entry = {
+        "file": os.path.basename(path),
+        "source": source,
+        "business_date": None if business_date is None else str(business_date),
+        "size": size,
+        "sha256": checksum,
+        "verified": problem is None,
+        "error": problem,
+        "at": datetime.now().isoformat(timespec="seconds"),
+    }
+    with _manifest_lock:
+        with open(os.path.join(os.path.dirname(path), MANIFEST), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    if problem:
+        os.replace(path, path + ".invalid")
+        raise DownloadError(f"{os.path.basename(path)}: {problem}")
+    return entry
+
+def _manifest_entries(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return []
+
+def _archive(run_path):
+    # Moves the verified files of one run into the archive; identical files are stored once
+    archived = 0
+    for source in os.listdir(run_path):
+        source_path = os.path.join(run_path, source)
+        if not os.path.isdir(source_path):
+            continue
+        for entry in _manifest_entries(source_path):
+            path = os.path.join(source_path, entry["file"])
+            if not entry["verified"] or not os.path.exists(path):
+                continue
+            day = entry["business_date"] or entry["at"][:10]
+            target_dir = os.path.join(DOWNLOAD_ARCHIVE_DIR, day, source)
+            target = os.path.join(target_dir, entry["file"])
+            if os.path.exists(target):
+                if sha256_of(target) == entry["sha256"]:
+                    continue
+                stem, ext = os.path.splitext(entry["file"])
+                target = os.path.join(target_dir, f"{stem}.{entry['sha256'][:8]}{ext}")
+            os.makedirs(target_dir, exist_ok=True)
+            shutil.move(path, target)
+            archived += 1
+    return archived
+
+def _prune(now=None):
+    # Drops archived days past DOWNLOAD_ARCHIVE_DAYS and run directories past DOWNLOAD_STALE_HOURS
+    now = now or time.time()
+    archive = os.path.abspath(DOWNLOAD_ARCHIVE_DIR)
+    for root, max_age in ((archive, DOWNLOAD_ARCHIVE_DAYS * 86400), (DOWNLOADS_DIR, DOWNLOAD_STALE_HOURS * 3600)):
+        try:
+            names = os.listdir(root)
+        except FileNotFoundError:
+            continue
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.abspath(path) == archive:
+                continue
+            try:
+                if now - os.path.getmtime(path) < max_age:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError as e:
+                print(f"Could not prune {path}: {e}")
+
+def finish_run(run_id, policy=None):
+    # Applies the download policy to one run's directory, then prunes old downloads
+    policy = (policy or DOWNLOAD_POLICY).lower()
+    if policy not in POLICIES:
+        print(f"Unknown DOWNLOAD_POLICY '{policy}', keeping downloads.")
+        policy = "keep"
+    if _bound_run_id.get() == run_id:
+        _bound_run_id.set(None)
+    run_path = os.path.join(DOWNLOADS_DIR, run_id)
+    if os.path.isdir(run_path):
+        try:
+            if policy == "archive":
+                print(f"Archived {_archive(run_path)} download(s) from run {run_id}.")
+            if policy in ("archive", "delete"):
+                shutil.rmtree(run_path)
+        except OSError as e:
+            print(f"Could not clean up downloads of run {run_id}: {e}")
+    _prune()
@@ -0,0 +1,272 @@
+import atexit
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from instrumentation import span
+
+# Shared Chrome factory and pool used by every extractor.
+# Browsers are handed out warm, reset between uses and always reclaimed,
+# so no Chrome process outlives the run that borrowed it.
+# Every browser runs a lightweight scraping profile: new headless mode, background
+# features off, and images, fonts, media and telemetry scripts (Dynatrace's
+# ruxitagentjs, analytics) blocked over CDP. A source that needs some of them back
+# lists the categories or patterns in "browser_allow" (sources.json) or
+# <SOURCE>_BROWSER_ALLOW; the block list is applied each time a browser is acquired.
+
+load_dotenv()
+MAX_BROWSERS = int(os.getenv("MAX_BROWSERS", "3"))  # Cap on concurrently running Chromes
+WARM_BROWSERS = int(os.getenv("WARM_BROWSERS", "0"))  # Pre-launched when the pool is created
+BROWSER_MAX_IDLE = float(os.getenv("BROWSER_MAX_IDLE", "300"))  # Idle Chromes are quit after this many seconds
+ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_ACQUIRE_TIMEOUT", "120"))
+BLOCK_RESOURCES = os.getenv("BROWSER_BLOCK_RESOURCES", "1").lower() not in ("0", "false", "no")
+BLOCK_EXTRA = [pattern.strip() for pattern in os.getenv("BROWSER_BLOCK_EXTRA", "").split(",") if pattern.strip()]
+
+def _extensions(*extensions):
+    # Network.setBlockedURLs wildcards match the whole URL, query string included
+    return [pattern for ext in extensions for pattern in (f"*.{ext}", f"*.{ext}?*")]
+
+BLOCKED_RESOURCES = {
+    "images": _extensions("png", "jpg", "jpeg", "gif", "webp", "svg", "ico", "bmp"),
+    "fonts": _extensions("woff", "woff2", "ttf", "otf", "eot"),
+    "media": _extensions("mp4", "webm", "ogg", "mp3", "wav", "m4a"),
+    "telemetry": [
+        "*ruxitagentjs*", "*/rb_*", "*dynatrace*", "*google-analytics.com*", "*googletagmanager.com*",
+        "*doubleclick.net*", "*hotjar*", "*connect.facebook.net*",
+    ],
+}
+
+CHROME_ARGUMENTS = (
+    "--headless=new",
+    "--window-size=1920,1080",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--metrics-recording-only",
+    "--no-first-run",
+    "--mute-audio",
+    "--disable-features=Translate,OptimizationHints,MediaRouter,AutofillServerCommunication",
+    "--disable-notifications",
+    "--disable-infobars",
+    "--disable-popup-blocking",
+)
+
+# Setup Chrome WebDriver (single place for the options all extractors share)
+def setup_driver(download_dir=None):
+    options = Options()
+    for argument in CHROME_ARGUMENTS:
+        options.add_argument(argument)
+
+    # Set up Chrome preferences
+    prefs = {
+        "credentials_enable_service": False,
+        "profile.password_manager_enabled": False,
+        "profile.password_manager_leak_detection": False,
+        "download.prompt_for_download": False,
+        "directory_upgrade": True,
+        "safebrowsing.enabled": True,
+        # Batch downloads (several VAS reports from one page) must not stop at the "multiple downloads" prompt
+        "profile.default_content_setting_values.automatic_downloads": 1,
+    }
+    if download_dir:
+        prefs["download.default_directory"] = os.path.abspath(download_dir)
+    options.add_experimental_option("prefs", prefs)
+
+    return webdriver.Chrome(options=options)
+
+def blocked_urls(source=None):
+    # URL patterns the browser must not load for this source
+    if not BLOCK_RESOURCES:
+        return []
+    allow = set()
+    if source is not None:
+        from extractors import get_registry
+        registered = get_registry().all.get(source)
+        allow = set(registered.browser_allow if registered else ())
+    urls = []
+    for category, patterns in BLOCKED_RESOURCES.items():
+        if category not in allow:
+            urls.extend(pattern for pattern in patterns if pattern not in allow)
+    urls.extend(pattern for pattern in BLOCK_EXTRA if pattern not in allow)
+    return urls
+
+def apply_profile(driver, source=None):
+    # Sets (or, for a browser reused from another source, replaces) the block list
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_urls(source)})
+
+def set_download_dir(driver, download_dir):
+    # Redirect downloads of an already running browser
+    driver.execute_cdp_cmd("Page.setDownloadBehavior", {
+        "behavior": "allow",
+        "downloadPath": os.path.abspath(download_dir),
+    })
+
+class DriverPool:
+    def __init__(self, max_size=MAX_BROWSERS, max_idle=BROWSER_MAX_IDLE, factory=setup_driver):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.factory = factory
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = []  # [(driver, released_at)], most recently used last
+        self._busy = set()
+        self._reaper = None
+        self._closed = False
+
+    def warm(self, count):
+        # Launch browsers in parallel so they are ready before the first extractor asks
+        count = min(count, self.max_size) - len(self._idle) - len(self._busy)
+        threads = [threading.Thread(target=self._launch_idle, daemon=True) for _ in range(max(0, count))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _launch_idle(self):
+        try:
+            driver = self.factory()
+        except Exception as e:
+            print(f"❌ Could not pre-launch browser: {e}")
+            return
+        with self._lock:
+            self._idle.append((driver, time.monotonic()))
+        self._start_reaper()
+
+    def acquire(self, download_dir=None, source=None, timeout=ACQUIRE_TIMEOUT):
+        if self._closed:
+            raise RuntimeError("Driver pool is shut down")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No browser available within {timeout}s (max {self.max_size})")
+        try:
+            driver = self._take_idle()
+            if driver is None:
+                with span("browser_launch"):
+                    driver = self.factory(download_dir)
+            elif download_dir:
+                set_download_dir(driver, download_dir)
+            apply_profile(driver, source)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._busy.add(driver)
+        return driver
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                driver, _ = self._idle.pop()
+            if self._is_alive(driver):
+                return driver
+            self._quit(driver)
+
+    def release(self, driver):
+        with self._lock:
+            if driver not in self._busy:
+                return
+            self._busy.discard(driver)
+        try:
+            if self._closed:
+                self._quit(driver)
+                return
+            try:
+                with span("cleanup"):
+                    self._reset(driver)
+            except Exception as e:
+                # A browser that can't be reset is not safe to hand out again
+                print(f"Discarding browser that failed to reset: {e}")
+                self._quit(driver)
+                return
+            with self._lock:
+                self._idle.append((driver, time.monotonic()))
+            self._start_reaper()
+        finally:
+            self._slots.release()
+
+    def _reset(self, driver):
+        # Close every window but one, drop all cookies and park on a blank page
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.switch_to.default_content()
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.get("about:blank")
+
+    def _is_alive(self, driver):
+        try:
+            driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Could not quit browser: {e}")
+
+    def reap_idle(self, max_idle=None):
+        max_idle = self.max_idle if max_idle is None else max_idle
+        now = time.monotonic()
+        with self._lock:
+            stale = [driver for driver, released_at in self._idle if now - released_at >= max_idle]
+            self._idle = [(driver, released_at) for driver, released_at in self._idle if driver not in stale]
+        for driver in stale:
+            self._quit(driver)
+        return len(stale)
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="driver-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        # Runs only while there are idle browsers to watch
+        while not self._closed:
+            time.sleep(min(30, self.max_idle))
+            self.reap_idle()
+            with self._lock:
+                if not self._idle:
+                    return
+
+    def shutdown(self):
+        self._closed = True
+        with self._lock:
+            drivers = [driver for driver, _ in self._idle] + list(self._busy)
+            self._idle = []
+            self._busy.clear()
+        for driver in drivers:
+            self._quit(driver)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+            atexit.register(_pool.shutdown)
+            if WARM_BROWSERS:
+                _pool.warm(WARM_BROWSERS)
+        return _pool
+
+def acquire_driver(download_dir=None, source=None):
+    return get_pool().acquire(download_dir=download_dir, source=source)
+
+def release_driver(driver):
+    get_pool().release(driver)
@@ -0,0 +1,141 @@
+import importlib
+import json
+import os
+import threading
+from dotenv import load_dotenv
+from reconciliation import Reconciliation, DEFAULT_EXPRESSION
+
+# Registry of balance sources, loaded from sources.json (SOURCES_CONFIG).
+# Each source has extractor backends as "module:function" strings returning the
+# balance (or None on failure), a timeout, an optional retry policy and flags.
+# Modules are imported only when a backend is actually used, so disabled sources
+# cost nothing. <SOURCE>_BACKEND in .env picks the preferred backend; the others
+# are tried in order as fallbacks, so Selenium stays available when HTTP breaks.
+# Adding a wallet or bank account is a config entry plus an extractor function,
+# with the reconciliation expression updated to include it.
+#
+#   "NAME": {
+#     "backends": {"http": "module:function", ...},     # required, in fallback order
+#     "batch_backends": {...},                          # optional, see extract_batch
+#     "timeout": 180,                                   # whole budget in seconds, retries included
+#     "retries": 3, "retry_delay": 5, "retry_max_delay": 60,
+#     "final": false,                                   # balance never changes once read for a date
+#     "accounts": ["7013252356"],                       # accounts read from the portal; the first is reported
+#     "browser_allow": ["fonts"],                       # resource categories/patterns the browser may load
+#     "enabled": true                                   # <NAME>_ENABLED=0 also disables it
+#   }
+
+load_dotenv()
+SOURCES_CONFIG = os.getenv("SOURCES_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sources.json"))
+DEFAULT_BACKEND = "http"
+DEFAULT_TIMEOUT = 180
+
+def load_backend(path):
+    module_name, func_name = path.split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+def _flag(value):
+    return str(value).lower() not in ("0", "false", "no", "off", "")
+
+def _list_setting(env_name, configured):
+    # Comma-separated list from the environment, else the list from the config
+    value = os.getenv(env_name)
+    if value is None:
+        return list(configured or [])
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+class Source:
+    def __init__(self, name, backends, batch_backends=None, timeout=DEFAULT_TIMEOUT, retries=None,
+                 retry_delay=None, retry_max_delay=None, final=False, enabled=True, description="", browser_allow=None,
+                 accounts=None):
+        if not backends:
+            raise ValueError(f"Source {name} has no backends")
+        self.name = name
+        self.backends = dict(backends)
+        self.batch_backends = dict(batch_backends or {})
+        # <NAME>_TIMEOUT, <NAME>_ENABLED, <NAME>_BROWSER_ALLOW and <NAME>_ACCOUNTS override the config
+        self.timeout = int(os.getenv(f"{name}_TIMEOUT", timeout))
+        self.browser_allow = _list_setting(f"{name}_BROWSER_ALLOW", browser_allow)
+        self.accounts = _list_setting(f"{name}_ACCOUNTS", accounts)
+        self.final = final
+        self.enabled = _flag(os.getenv(f"{name}_ENABLED", enabled))
+        self.description = description
+        self._retry = (retries, retry_delay, retry_max_delay)
+
+    @property
+    def policy(self):
+        from resilience import policy_for
+        return policy_for(self.name, *self._retry)
+
+    def backend_order(self, backends=None):
+        backends = self.backends if backends is None else backends
+        preferred = os.getenv(f"{self.name}_BACKEND", DEFAULT_BACKEND).lower()
+        if preferred not in backends:
+            preferred = next(iter(backends))
+        return [preferred] + [name for name in backends if name != preferred]
+
+    def extract(self):
+        for backend in self.backend_order():
+            try:
+                value = load_backend(self.backends[backend])()
+            except Exception as e:
+                print(f"❌ {self.name} {backend} backend failed: {e}")
+                value = None
+            if value is not None:
+                return value
+            print(f"{self.name}: {backend} backend gave no balance, trying next backend...")
+        return None
+
+    def extract_batch(self, *args, **kwargs):
+        # Like extract, for the batch functions; a backend whose result has no values at all counts as failed
+        if not self.batch_backends:
+            raise ValueError(f"Source {self.name} has no batch backends")
+        for backend in self.backend_order(self.batch_backends):
+            try:
+                values = load_backend(self.batch_backends[backend])(*args, **kwargs)
+            except Exception as e:
+                print(f"❌ {self.name} {backend} batch backend failed: {e}")
+                values = None
+            if values and any(value is not None for value in values.values()):
+                return values
+            print(f"{self.name}: {backend} batch backend gave no balances, trying next backend...")
+        return None
+
+    def __repr__(self):
+        return f"Source('{self.name}', backends={list(self.backends)}, timeout={self.timeout})"
+
+class Registry:
+    def __init__(self, config):
+        self.all = {name: Source(name, **options) for name, options in config["sources"].items()}
+        # Enabled sources in config order; the runner schedules exactly these
+        self.sources = {name: source for name, source in self.all.items() if source.enabled}
+        self.reconciliation = Reconciliation(os.getenv("RECONCILIATION") or config.get("reconciliation") or DEFAULT_EXPRESSION)
+        unknown = [name for name in self.reconciliation.sources if name not in self.all]
+        if unknown:
+            raise ValueError(f"Reconciliation '{self.reconciliation.expression}' uses unknown source(s): {', '.join(unknown)}")
+        disabled = [name for name in self.reconciliation.sources if name not in self.sources]
+        if disabled:
+            raise ValueError(f"Reconciliation '{self.reconciliation.expression}' uses disabled source(s): {', '.join(disabled)}")
+
+    def __getitem__(self, name):
+        return self.all[name]
+
+def load_registry(path=None):
+    with open(path or SOURCES_CONFIG, encoding="utf-8") as f:
+        return Registry(json.load(f))
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = load_registry()
+        return _registry
+
+def extract(source):
+    return get_registry()[source].extract()
+
+def extract_batch(source, *args, **kwargs):
+    return get_registry()[source].extract_batch(*args, **kwargs)
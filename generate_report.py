@@ -1,26 +1,41 @@
+import contextvars
 import os
-import certifi
-# Patch for SSL certificate errors with SendGrid
-os.environ['SSL_CERT_FILE'] = certifi.where()
-os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
-# If you still get SSL errors, try running this script with Python 3.10–3.12, as some newer/older versions may have SSL bugs.
+import sys
+import json
+import threading
 from dotenv import load_dotenv
-import sendgrid
-from sendgrid.helpers.mail import Mail
-import schedule
 import time
 from datetime import datetime, timedelta
-import pytz
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 
-# Import the real extraction functions
-from main import login_and_test_v2
-from main2 import login_vas
-from main3 import login_and_get_cimb_balance
+# Extraction goes through the source registry (sources.json; HTTP first, Selenium fallback),
+# wrapped in retries with backoff and a per-source circuit breaker.
+# Heavy modules (selenium, pytz, the extractors themselves) are imported only when
+# a run fires, so the idle scheduler stays small.
+from extractors import get_registry
+from resilience import call_with_retry, get_breaker, RetryPolicy
+from instrumentation import span, set_source, start_run, finish_run, annotate, current_run
 
 load_dotenv()
-SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
-FROM_EMAIL = os.getenv("SENDGRID_FROM_EMAIL")
-TO_EMAIL = [email.strip() for email in os.getenv("SENDGRID_TO_EMAIL", "").split(",") if email.strip()]
+
+# Extra formats attached to the report email, e.g. "csv,xlsx" (csv, xlsx, json)
+REPORT_ATTACHMENTS = [fmt.strip().lower() for fmt in os.getenv("REPORT_ATTACHMENTS", "").split(",") if fmt.strip()]
+
+# Balance sources: name -> (extractor, timeout in seconds), one per enabled source in the registry.
+# Each source runs in its own worker so one slow portal doesn't hold up the others.
+# The timeout is the source's whole budget, retries included.
+REGISTRY = get_registry()
+SOURCES = {
+    name: (partial(call_with_retry, name, source.extract, budget=source.timeout, policy=source.policy), source.timeout)
+    for name, source in REGISTRY.sources.items()
+}
+
+def send_email(subject, plain_text_content, html_content, attachments=None):
+    # Queued in the on-disk outbox and sent in the background, with retries (see mailer.py)
+    import mailer
+    message_id = mailer.get_mailer().enqueue(subject, plain_text_content, html_content, attachments=attachments)
+    print(f"Email queued for delivery ({message_id}).")
 
 def safe_float(val):
     try:
@@ -30,101 +45,270 @@ def safe_float(val):
     except Exception:
         return None
 
-def run_report():
-    print("Extracting V2 balance...")
-    V2_balance = safe_float(login_and_test_v2())
-    print("Extracting VAS balance...")
-    VAS_balance = safe_float(login_vas())
-    print("Extracting CIMB balance...")
-    CIMB_balance = safe_float(login_and_get_cimb_balance())
-
-    report = f"""
-Daily Float Reconciliation Report\n\n"""
-    if CIMB_balance is not None:
-        report += f"CIMB Balance: {CIMB_balance:,.2f} THB\n"
-    else:
-        report += f"CIMB Balance: ERROR\n"
-    if V2_balance is not None:
-        report += f"V2 Balance: {V2_balance:,.2f} THB\n"
-    else:
-        report += f"V2 Balance: ERROR\n"
-    if VAS_balance is not None:
-        report += f"VAS Balance: {VAS_balance:,.2f} THB\n"
-    else:
-        report += f"VAS Balance: ERROR\n"
+def _extract_source(name, extractor):
+    # Runs on a worker thread; tags every span recorded there with the source name
+    set_source(name)
+    try:
+        with span("extract", name):
+            return extractor()
+    finally:
+        set_source(None)
+
+def extract_balances(sources=SOURCES):
+    # Start every extractor at once and collect each result within its own timeout.
+    # A source that fails or times out gives None, same as a failed extractor.
+    balances = {}
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="extract")
+    started = time.monotonic()
+    futures = {}
+    for name, (extractor, timeout) in sources.items():
+        print(f"Extracting {name} balance...")
+        # Each worker runs in a copy of this context, so its spans land in the caller's run
+        futures[name] = executor.submit(contextvars.copy_context().run, _extract_source, name, extractor)
+    try:
+        for name, future in futures.items():
+            timeout = sources[name][1]
+            remaining = max(0, timeout - (time.monotonic() - started))
+            wait([future], timeout=remaining)
+            if not future.done():
+                print(f"❌ {name} extraction timed out after {timeout}s")
+                future.cancel()
+                balances[name] = None
+                continue
+            try:
+                balances[name] = safe_float(future.result())
+            except Exception as e:
+                print(f"❌ {name} extraction failed: {e}")
+                balances[name] = None
+    finally:
+        # Don't block the report on a hung worker; it finishes (or dies) in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+    print(f"Extraction finished in {time.monotonic() - started:.1f}s")
+    return balances
+
+def record_balances(balances, report_date):
+    # Appends the run to the local balance history; returns that day's trend row (or None)
+    import balance_store
+    run = current_run()
+    metadata = {"missing": [name for name, value in balances.items() if value is None]}
+    if run is not None:
+        metadata["extract_s"] = {
+            record["source"]: record["duration_s"] for record in run.spans if record["stage"] == "extract"
+        }
+    try:
+        with span("store"):
+            return balance_store.record_run(balances, report_date, run_id=run.run_id if run else None, metadata=metadata)
+    except Exception as e:
+        print(f"Could not record balances in history: {e}")
+        return None
+
+def cached_sources(sources, business_date, force_refresh=False):
+    # Same sources, served from the result cache when this business date was already extracted
+    import result_cache
+    return {
+        name: (result_cache.memoize(name, extractor, business_date, force_refresh=force_refresh), timeout)
+        for name, (extractor, timeout) in sources.items()
+    }
+
+# The daily report and the monitor poll never run at the same time: they log in to the
+# same portals (CIMB allows one session per user) and share the warm CIMB browser.
+# A poll that fires during the report is skipped, the next one is minutes away;
+# the report waits for a poll in progress to finish.
+_run_lock = threading.Lock()
+
+def run_report(force_refresh=False):
+    # Every run gets its own entry (spans + summary) in the structured run log.
+    # force_refresh re-scrapes every portal even if the result cache has this business date.
+    if not _run_lock.acquire(blocking=False):
+        print("Monitor poll in progress, report starts when it finishes...")
+        _run_lock.acquire()
+    try:
+        run_id = _start_downloads(start_run("report"))
+        try:
+            _run_report(force_refresh)
+        finally:
+            _finish_downloads(run_id)
+            finish_run()
+    finally:
+        _run_lock.release()
+
+def _start_downloads(run):
+    # Binds this run's download directory once, at the start; extractor workers inherit it
+    import downloads
+    downloads.bind_run(run.run_id)
+    return run.run_id
+
+def _finish_downloads(run_id):
+    # Archives or deletes this run's downloads only (see downloads.py); other runs' files are left alone
+    import downloads
+    with span("cleanup"):
+        downloads.finish_run(run_id)
 
+def _run_report(force_refresh=False):
     report_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    balances = extract_balances(cached_sources(SOURCES, report_date, force_refresh))
+    annotate(balances=balances)
+    trend = record_balances(balances, report_date)
 
-    html_report = f'''
-<html>
-  <head>
-    <style>
-      body {{ font-family: Arial, sans-serif; }}
-      .report-table {{ border-collapse: collapse; width: 400px; margin: 18px 0; }}
-      .report-table th, .report-table td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-      .report-table th {{ background-color: #f2f2f2; font-weight: bold; }}
-      .ok {{ color: #228B22; font-weight: bold; }}
-      .warn {{ color: #B22222; font-weight: bold; }}
-      .error {{ color: #B22222; font-weight: bold; }}
-    </style>
-  </head>
-  <body>
-    <h2>Daily Float Reconciliation Report for {report_date}</h2>
-    <table class="report-table">
-      <tr><th>Account</th><th>Balance (THB)</th></tr>
-      <tr><td>CIMB</td><td>{(f"{CIMB_balance:,.2f}" if CIMB_balance is not None else '<span class="error">ERROR</span>')}</td></tr>
-      <tr><td>V2</td><td>{(f"{V2_balance:,.2f}" if V2_balance is not None else '<span class="error">ERROR</span>')}</td></tr>
-      <tr><td>VAS</td><td>{(f"{VAS_balance:,.2f}" if VAS_balance is not None else '<span class="error">ERROR</span>')}</td></tr>
-    </table>
-'''
-
-    if None not in (CIMB_balance, V2_balance, VAS_balance):
-        result = CIMB_balance - (V2_balance + VAS_balance)
-        report += f"\nCIMB - (V2 + VAS) = {result:,.2f} THB\n\n"
-        if result >= 0:
-            summary = f"CIMB balance is sufficient. Surplus: {result:,.2f} THB."
-            html_report += f'<p class="ok">CIMB - (V2 + VAS) = {result:,.2f} THB</p>'
-            html_report += f'<p class="ok">CIMB balance is sufficient. Surplus: {result:,.2f} THB.</p>'
-        else:
-            summary = f"Warning: Combined V2 and VAS float exceeds CIMB account by {abs(result):,.2f} THB!"
-            html_report += f'<p class="warn">CIMB - (V2 + VAS) = {result:,.2f} THB</p>'
-            html_report += f'<p class="warn">Warning: Combined V2 and VAS float exceeds CIMB account by {abs(result):,.2f} THB!</p>'
-        report += summary
+    # One data model, rendered to every format (see rendering.py)
+    import rendering
+    report_data = rendering.build_report(balances, report_date, trend)
+    report = rendering.render_text(report_data)
+    html_report = rendering.render_html(report_data)
+
+    print(report)
+
+    # --- Queue the email (delivered in the background, so a slow mail API doesn't hold up the run) ---
+    import mailer
+    if mailer.configured():
+        files = rendering.attachments([report_data], REPORT_ATTACHMENTS)
+        send_email(report_data.subject, report, html_report, attachments=files)
     else:
-        report += "\nOne or more balances could not be extracted. Please check logs.\n"
-        html_report += '<p class="error">One or more balances could not be extracted. Please check logs.</p>'
+        print("Email not configured (sender, recipients or transport credentials missing). Email not sent.")
 
-    html_report += '</body></html>'
+# --- Intra-day monitoring ---
+# Polls every source on MONITOR_SCHEDULE and alerts as soon as the reconciliation
+# (CIMB - (V2 + VAS) by default) drops below MONITOR_THRESHOLD. Each poll is cheap:
+# V2 reuses its logged-in HTTP session, CIMB keeps one logged-in browser between polls
+# (main3.WarmSession), and "final" sources such as VAS (previous day's report) are
+# fetched once per day.
+# There are no retries inside a poll; the next poll is the retry, and the circuit
+# breakers keep a failing portal from being hit every few minutes. Polls have breakers
+# of their own ("<SOURCE>:monitor"), so failed polls never stop the daily report's retries.
+MONITOR_SCHEDULE = os.getenv("MONITOR_SCHEDULE", "*/5 * * * *")
+MONITOR_THRESHOLD = float(os.getenv("MONITOR_THRESHOLD", "0"))
+MONITOR_REMIND_AFTER = float(os.getenv("MONITOR_REMIND_AFTER", "0"))  # Seconds before repeating an open alert; 0 = never
+MONITOR_DOWN_POLLS = int(os.getenv("MONITOR_DOWN_POLLS", "3"))  # Failed polls in a row before a source counts as down
+MONITOR_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".monitor_state.json")
 
-    print(report)
+class DailyCache:
+    # Remembers a balance that only changes once per business day
+    def __init__(self, func):
+        self.func = func
+        self.day = None
+        self.value = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        today = (datetime.now() - timedelta(days=1)).date()
+        with self._lock:
+            if self.day != today or self.value is None:
+                self.value = self.func()
+                self.day = today if self.value is not None else None
+            return self.value
 
-    # --- Send email via SendGrid ---
-    if SENDGRID_API_KEY and FROM_EMAIL and TO_EMAIL:
-        sg = sendgrid.SendGridAPIClient(api_key=SENDGRID_API_KEY.strip('"'))
-        message = Mail(
-            from_email=FROM_EMAIL,
-            to_emails=TO_EMAIL,
-            subject=f"Daily Float Reconciliation Report for {report_date}",
-            plain_text_content=report,
-            html_content=html_report
-        )
+def _monitor_source(source):
+    poll = partial(call_with_retry, source.name, source.extract, policy=RetryPolicy(attempts=1),
+                   breaker=get_breaker(f"{source.name}:monitor"))
+    return DailyCache(poll) if source.final else poll
+
+MONITOR_SOURCES = {name: (_monitor_source(source), source.timeout) for name, source in REGISTRY.sources.items()}
+
+class AlertTracker:
+    # Open alerts by condition key. A condition alerts once when it starts (and again every
+    # remind_after seconds if set) and sends one "resolved" notice when it clears.
+    # State is kept on disk so a restart doesn't repeat alerts that were already sent.
+    def __init__(self, state_path=MONITOR_STATE_PATH, remind_after=MONITOR_REMIND_AFTER, clock=time.time):
+        self.state_path = state_path
+        self.remind_after = remind_after
+        self.clock = clock
+        self.open = self._load()
+
+    def _load(self):
+        if not self.state_path:
+            return {}
         try:
-            response = sg.send(message)
-            print(f"Email sent! Status code: {response.status_code}")
-        except Exception as e:
-            print(f"Failed to send email: {e}")
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save(self):
+        if not self.state_path:
+            return
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.open, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def update(self, active, checked):
+        # active: {key: message} for conditions present now; checked: keys this poll could evaluate.
+        # Returns [(kind, key, message)] with kind "alert", "reminder" or "resolved".
+        now = self.clock()
+        notices = []
+        for key, message in active.items():
+            entry = self.open.get(key)
+            if entry is None:
+                self.open[key] = {"since": now, "last_sent": now, "message": message}
+                notices.append(("alert", key, message))
+            elif self.remind_after and now - entry["last_sent"] >= self.remind_after:
+                entry.update(last_sent=now, message=message)
+                notices.append(("reminder", key, message))
+        for key in [key for key in self.open if key in checked and key not in active]:
+            entry = self.open.pop(key)
+            notices.append(("resolved", key, f"Cleared after {(now - entry['since']) / 60:.0f} min: {entry['message']}"))
+        if notices:
+            self._save()
+        return notices
+
+_alerts = None
+_failed_polls = {name: 0 for name in MONITOR_SOURCES}
+
+def evaluate_alerts(balances, threshold=MONITOR_THRESHOLD):
+    # Conditions for one poll: the net float below threshold, and sources down for several polls
+    active = {}
+    checked = set()
+    reconciliation = REGISTRY.reconciliation
+    net = reconciliation.evaluate(balances)
+    if net is not None:
+        checked.add("shortfall")
+        if net < threshold:
+            active["shortfall"] = f"{reconciliation.expression} = {net:,.2f} THB is below the {threshold:,.2f} THB threshold"
+    for name, value in balances.items():
+        key = f"down:{name}"
+        checked.add(key)
+        _failed_polls[name] = 0 if value is not None else _failed_polls.get(name, 0) + 1
+        if _failed_polls[name] >= MONITOR_DOWN_POLLS:
+            active[key] = f"{name} balance could not be read for {_failed_polls[name]} polls in a row"
+    return net, active, checked
+
+def send_alert(kind, key, message, balances):
+    subject = f"[Float {'resolved' if kind == 'resolved' else 'alert'}] {message}"
+    print(f"🔔 {subject}")
+    import mailer
+    if mailer.configured():
+        details = ", ".join("{} {}".format(name, "n/a" if value is None else f"{value:,.2f}") for name, value in balances.items())
+        css_class = "ok" if kind == "resolved" else "warn"
+        html = f'<html><body><p class="{css_class}">{message}</p><p>Balances (THB): {details}</p></body></html>'
+        send_email(subject, f"{message}\n\nBalances (THB): {details}\n", html)
     else:
-        print("SendGrid credentials not set. Email not sent.")
+        print("Email not configured. Alert not emailed.")
 
-    # --- Clean up downloads directory ---
-    import glob
-    downloads_dir = os.path.join(os.path.dirname(__file__), "downloads")
-    for file_path in glob.glob(os.path.join(downloads_dir, "*")):
-        try:
-            os.remove(file_path)
-            print(f"Deleted: {file_path}")
-        except Exception as e:
-            print(f"Could not delete {file_path}: {e}")
+def monitor_poll():
+    if not _run_lock.acquire(blocking=False):
+        print("[monitor] Report in progress, skipping this poll.")
+        return
+    try:
+        _monitor_poll()
+    finally:
+        _run_lock.release()
+
+def _monitor_poll():
+    global _alerts
+    run_id = _start_downloads(start_run("monitor"))
+    try:
+        balances = extract_balances(MONITOR_SOURCES)
+        annotate(balances=balances)
+        if _alerts is None:
+            _alerts = AlertTracker()
+        net, active, checked = evaluate_alerts(balances)
+        if net is not None:
+            print(f"[monitor] {REGISTRY.reconciliation.expression} = {net:,.2f} THB")
+        for kind, key, message in _alerts.update(active, checked):
+            send_alert(kind, key, message, balances)
+    finally:
+        _finish_downloads(run_id)
+        finish_run()
 
 
 if __name__ == "__main__":
@@ -132,20 +316,32 @@ if __name__ == "__main__":
     environment = os.getenv("ENVIRONMENT", "").lower()
     if environment == "development":
         print("Running in development mode - executing report once...")
-        run_report()
+        run_report(force_refresh="--refresh" in sys.argv[1:])
         print("Development run completed. Exiting.")
         exit(0)
     
-    # Always use Asia/Bangkok time for scheduling
-    BANGKOK_TZ = pytz.timezone("Asia/Bangkok")
-    print("Scheduler started. Waiting for next run at 00:15 Asia/Bangkok time...")
-    last_run_date = None
-    while True:
-        now_bangkok = datetime.now(BANGKOK_TZ)
-        # Run only once per day at 00:15
-        if now_bangkok.hour == 0 and now_bangkok.minute == 15:
-            if last_run_date != now_bangkok.date():
-                run_report()
-                last_run_date = now_bangkok.date()
-        print("Waiting for next run...")
-        time.sleep(30)
\ No newline at end of file
+    # Always use Asia/Bangkok time for scheduling (default: daily at 00:15)
+    from scheduler import Scheduler, Job, schedules_from_env
+    jobs = [Job(f"report[{expression}]", expression, run_report) for expression in schedules_from_env()]
+    # Monitor mode (ENVIRONMENT=monitor or --monitor) adds the intra-day poll next to the daily report
+    monitor = environment == "monitor" or "--monitor" in sys.argv[1:]
+    # The warm CIMB browser only makes sense when a registered source extracts through main3
+    warm_cimb = monitor and any(
+        path.startswith("main3:") for source in REGISTRY.sources.values() for path in source.backends.values()
+    )
+    if warm_cimb:
+        import main3
+        main3.open_warm_session()
+    import mailer
+    if mailer.configured():
+        # Resumes mail a previous process left in the outbox now, not with the next report
+        mailer.get_mailer()
+    if monitor:
+        jobs.append(Job("monitor", MONITOR_SCHEDULE, monitor_poll))
+        print(f"Monitoring every '{MONITOR_SCHEDULE}', alert threshold {MONITOR_THRESHOLD:,.2f} THB.")
+    print(f"Scheduler started with {len(jobs)} schedule(s), Asia/Bangkok time.")
+    try:
+        Scheduler(jobs).run_forever()
+    finally:
+        if warm_cimb:
+            main3.close_warm_session()
\ No newline at end of file
@@ -0,0 +1,301 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from instrumentation import span
+from session_cache import restore_cookie_jar, save_cookie_jar, clear_session
+import downloads
+
+# Browserless backend for V2 and VAS: form POST login, HTML parsing and
+# report download over a pooled requests.Session. Any failure returns None
+# so extractors.py can fall back to the Selenium backend. Session cookies go through
+# the same encrypted cache as the browser (session_cache.py), so a new process
+# reuses a live portal session instead of logging in again.
+
+load_dotenv()
+V2_USERNAME = os.getenv("V2_USERNAME")
+V2_PASSWORD = os.getenv("V2_PASSWORD")
+VAS_USERNAME = os.getenv("VAS_USERNAME")
+VAS_PASSWORD = os.getenv("VAS_PASSWORD")
+V2_BASE_URL = os.getenv("V2_BASE_URL", "https://v2.ipps.co.th").rstrip("/")
+VAS_BASE_URL = os.getenv("VAS_BASE_URL", "https://va-vasbo.ipps.co.th").rstrip("/")
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "20"))
+MAX_PARALLEL_DOWNLOADS = int(os.getenv("VAS_MAX_PARALLEL_DOWNLOADS", "4"))
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+# One keep-alive session per portal, reused across runs of a long-lived process
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def _username(source):
+    return {"V2": V2_USERNAME, "VAS": VAS_USERNAME}.get(source)
+
+def get_session(source):
+    with _sessions_lock:
+        session = _sessions.get(source)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(4, MAX_PARALLEL_DOWNLOADS))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            restore_cookie_jar(session.cookies, source, _username(source))
+            _sessions[source] = session
+        return session
+
+def save_session(source):
+    # Caches the portal cookies after a successful login
+    session = _sessions.get(source)
+    if session is not None:
+        save_cookie_jar(session.cookies, source, _username(source))
+
+def reset_session(source):
+    # Drops the pooled session and its cached cookies, so the next attempt logs in afresh
+    with _sessions_lock:
+        session = _sessions.pop(source, None)
+    clear_session(source, _username(source))
+    if session is not None:
+        session.close()
+
+class PageParser(HTMLParser):
+    # Collects forms, visible text and table rows (text + links) from one page
+    def __init__(self):
+        super().__init__()
+        self.forms = []
+        self.texts = []
+        self.rows = []
+        self._row = None
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in ("script", "style"):
+            self._skip += 1
+        elif tag == "form":
+            self.forms.append({"action": attrs.get("action") or "", "method": (attrs.get("method") or "get").lower(), "fields": {}, "ids": {}})
+        elif tag in ("input", "select", "textarea") and self.forms:
+            name = attrs.get("name")
+            if name and attrs.get("type") not in ("button", "submit", "reset", "image"):
+                self.forms[-1]["fields"][name] = attrs.get("value") or ""
+                if attrs.get("id"):
+                    self.forms[-1]["ids"][attrs["id"]] = name
+        elif tag == "tr":
+            self._row = {"text": [], "links": []}
+            self.rows.append(self._row)
+        elif tag == "a" and self._row is not None:
+            href = attrs.get("href")
+            if href and href != "#" and not href.startswith("javascript:"):
+                self._row["links"].append(href)
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip:
+            self._skip -= 1
+        elif tag == "tr":
+            self._row = None
+
+    def handle_data(self, data):
+        text = data.strip()
+        if not text or self._skip:
+            return
+        self.texts.append(text)
+        if self._row is not None:
+            self._row["text"].append(text)
+
+def parse_page(html):
+    parser = PageParser()
+    parser.feed(html)
+    parser.close()
+    return parser
+
+def find_form(page, field):
+    # First form containing the given field name or element id
+    for form in page.forms:
+        if field in form["fields"] or field in form["ids"]:
+            return form
+    return None
+
+def submit_form(session, page_url, form, values):
+    fields = dict(form["fields"])
+    for key, value in values.items():
+        fields[form["ids"].get(key, key)] = value
+    action = urljoin(page_url, form["action"] or page_url)
+    if form["method"] == "post":
+        return session.post(action, data=fields, timeout=HTTP_TIMEOUT)
+    return session.get(action, params=fields, timeout=HTTP_TIMEOUT)
+
+def parse_v2_balance(html):
+    # Same rule as the Selenium XPath: first "Balance: ..." text after the "E-Money" label
+    texts = parse_page(html).texts
+    for idx, text in enumerate(texts):
+        if text == "E-Money":
+            for following in texts[idx + 1:idx + 10]:
+                if following.startswith("Balance:"):
+                    balance_str = following.replace("Balance:", "").replace("THB", "").replace(",", "").strip()
+                    return float(balance_str)
+    return None
+
+# V2 E-Money balance over HTTP
+def fetch_v2_balance():
+    session = get_session("V2")
+    login_url = f"{V2_BASE_URL}/agents/login"
+    try:
+        with span("page_load", "V2", backend="http"):
+            response = session.get(login_url, timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+        # A live session is redirected from the login page straight to the dashboard
+        balance_value = parse_v2_balance(response.text)
+        if balance_value is None:
+            form = find_form(parse_page(response.text), "email")
+            if form is None:
+                print("❌ V2 login form not found")
+                return None
+            with span("login", "V2", backend="http"):
+                response = submit_form(session, response.url, form, {"email": V2_USERNAME, "password": V2_PASSWORD})
+                response.raise_for_status()
+            with span("parse", "V2", backend="http"):
+                balance_value = parse_v2_balance(response.text)
+            if balance_value is not None:
+                save_session("V2")
+        if balance_value is None:
+            print("❌ V2 balance not found after login")
+            reset_session("V2")
+            return None
+        print(f"✅ Extracted E-Money Balance (HTTP): {balance_value} THB")
+        return balance_value
+    except Exception as e:
+        print("❌ Error during V2 HTTP extraction:", e)
+        reset_session("V2")
+        return None
+
+def _vas_login(session):
+    login_url = f"{VAS_BASE_URL}/vas-web/auth/login"
+    response = session.get(login_url, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    form = find_form(parse_page(response.text), "usernameforshow")
+    if form is None:
+        raise RuntimeError("VAS login form not found")
+    # The visible *forshow inputs are copied into the real fields by the page's JS
+    values = {"usernameforshow": VAS_USERNAME, "passwordforshow": VAS_PASSWORD}
+    for name in form["fields"]:
+        if "forshow" not in name and "user" in name.lower():
+            values[name] = VAS_USERNAME
+        elif "forshow" not in name and "pass" in name.lower():
+            values[name] = VAS_PASSWORD
+    response = submit_form(session, response.url, form, values)
+    response.raise_for_status()
+    if "/auth/login" in response.url:
+        raise RuntimeError("VAS login rejected")
+    save_session("VAS")
+
+def _open_vas_report_page(session):
+    report_url = f"{VAS_BASE_URL}/vas-web/report/amc_all_report/"
+    response = session.get(report_url, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    page = parse_page(response.text)
+    form = find_form(page, "businessDate")
+    if form is None:
+        # Session expired: redirected to the login form
+        with span("login", "VAS", backend="http"):
+            _vas_login(session)
+        response = session.get(report_url, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        form = find_form(parse_page(response.text), "businessDate")
+    if form is None:
+        raise RuntimeError("VAS report search form not found")
+    return response.url, form
+
+def find_report_link(html, filename_prefix, file_date):
+    for row in parse_page(html).rows:
+        row_text = " ".join(row["text"])
+        if filename_prefix in row_text and file_date in row_text and row["links"]:
+            return row["links"][0]
+    return None
+
+def _download_report(session, page_url, form, business_date, download_dir):
+    # Searches one business date on the report page and saves its xlsx; returns the path or None
+    file_date = business_date.strftime("%Y%m%d")
+    expected_filename = f"UserAcccountStatReport_{file_date}.xlsx"
+    with span("navigation", "VAS", backend="http"):
+        response = submit_form(session, page_url, form, {"businessDate": business_date.strftime("%d/%m/%Y")})
+        response.raise_for_status()
+    link = find_report_link(response.text, "UserAcccountStatReport", file_date)
+    if link is None:
+        print(f"❌ Could not find report row for {expected_filename} (HTTP)")
+        return None
+    os.makedirs(download_dir, exist_ok=True)
+    file_path = os.path.join(download_dir, expected_filename)
+    with span("download", "VAS", backend="http"):
+        with session.get(urljoin(response.url, link), stream=True, timeout=HTTP_TIMEOUT) as download:
+            download.raise_for_status()
+            length = download.headers.get("Content-Length")
+            # Written under .part and renamed when complete, like a browser download
+            with open(file_path + ".part", "wb") as f:
+                for chunk in download.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+        os.replace(file_path + ".part", file_path)
+    try:
+        downloads.verify(file_path, "VAS", business_date, expected_size=int(length) if length and length.isdigit() else None)
+    except downloads.DownloadError as e:
+        print(f"❌ Downloaded report rejected (HTTP): {e}")
+        return None
+    print(f"✅ Download complete (HTTP): {file_path}")
+    return file_path
+
+def download_vas_report(download_dir=None, business_date=None):
+    # Returns the path of the downloaded UserAcccountStatReport_YYYYMMDD.xlsx, or None
+    business_date = business_date or (datetime.now() - timedelta(days=1)).date()
+    return download_vas_reports([business_date], download_dir)[business_date]
+
+def download_vas_reports(business_dates, download_dir=None, max_workers=MAX_PARALLEL_DOWNLOADS):
+    # One login, then every business date searched and downloaded concurrently over the
+    # same session. Returns {date: file path or None}. Same signature as
+    # main2.download_vas_reports; download_dir defaults to this run's own directory (see downloads.py).
+    download_dir = download_dir or downloads.run_dir("VAS")
+    session = get_session("VAS")
+    try:
+        with span("navigation", "VAS", backend="http"):
+            page_url, form = _open_vas_report_page(session)
+    except Exception as e:
+        print("❌ Error during VAS HTTP download:", e)
+        reset_session("VAS")
+        return {business_date: None for business_date in business_dates}
+
+    def download(business_date):
+        try:
+            return _download_report(session, page_url, form, business_date, download_dir)
+        except Exception as e:
+            print(f"❌ Error during VAS HTTP download for {business_date:%Y-%m-%d}:", e)
+            return None
+
+    if len(business_dates) == 1:
+        paths = [download(business_dates[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vas-download") as executor:
+            # Every worker gets a copy of the caller's context, so its spans stay in the current run
+            futures = [executor.submit(contextvars.copy_context().run, download, business_date) for business_date in business_dates]
+            paths = [future.result() for future in futures]
+    if not any(paths):
+        # Nothing came through; start the next attempt with a fresh login
+        reset_session("VAS")
+    return dict(zip(business_dates, paths))
+
+# VAS balance over HTTP: download yesterday's report and read the balance cell
+def fetch_vas_balance():
+    file_path = download_vas_report()
+    if file_path is None:
+        return None
+    from report_parser import read_vas_balance
+    return read_vas_balance(file_path)
+
+# VAS balance per business date in [start, end], one login for the whole range
+def fetch_vas_balances(start, end=None, download_dir=None):
+    from main2 import business_dates
+    from report_parser import read_vas_balance
+    paths = download_vas_reports(business_dates(start, end or start), download_dir)
+    return {business_date: (read_vas_balance(path) if path else None) for business_date, path in paths.items()}
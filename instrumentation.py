@@ -0,0 +1,220 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+# Per-stage timing for each run. Every span (browser launch, page load, login,
+# navigation, download, parse, email send, cleanup) is appended to a JSON-lines
+# run log as it finishes, followed by one summary line per run. Optionally the
+# latest numbers are also written as a Prometheus textfile (METRICS_TEXTFILE).
+# Outside an active run spans cost one clock read and are not recorded.
+# The active run is context-local (contextvars), so a monitor poll and the daily report
+# running at the same time each record into their own run; work handed to a thread
+# pool must be submitted with contextvars.copy_context().run to stay in the run.
+# Work that outlives its run's context (the mailer's sender thread) records against
+# the run id it was handed, with record_span.
+
+load_dotenv()
+RUN_LOG_PATH = os.getenv("RUN_LOG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "run_log.jsonl"))
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "")
+
+_run = contextvars.ContextVar("run", default=None)
+_source = contextvars.ContextVar("source", default=None)
+_active_runs = {}  # run_id -> Run, for record_span
+_write_lock = threading.Lock()
+
+def _utc_now():
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+def _write_event(event):
+    if not RUN_LOG_PATH:
+        return
+    line = json.dumps(event, default=str)
+    with _write_lock:
+        os.makedirs(os.path.dirname(RUN_LOG_PATH) or ".", exist_ok=True)
+        with open(RUN_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+class Run:
+    def __init__(self, kind):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.started_at = _utc_now()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.fields = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, record):
+        with self._lock:
+            self.spans.append(record)
+        _write_event({"type": "span", "run_id": self.run_id, **record})
+
+    def increment(self, name, source=None, amount=1):
+        key = (name, source)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def summary(self):
+        total = time.perf_counter() - self.started
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+        # "extract" wraps a whole source, so the slowest stage is looked for inside it
+        inner = [record for record in spans if record["stage"] != "extract"] or spans
+        slowest = max(inner, key=lambda s: s["duration_s"], default=None)
+        per_source = {}
+        for record in spans:
+            stages = per_source.setdefault(record["source"] or "run", {})
+            stages[record["stage"]] = round(stages.get(record["stage"], 0) + record["duration_s"], 3)
+        return {
+            "type": "summary",
+            "run_id": self.run_id,
+            "kind": self.kind,
+            "started_at": self.started_at,
+            "finished_at": _utc_now(),
+            "total_s": round(total, 3),
+            "slowest_stage": None if slowest is None else {
+                "source": slowest["source"], "stage": slowest["stage"], "duration_s": slowest["duration_s"],
+            },
+            "retries": {source or "run": count for (name, source), count in counters.items() if name == "retries"},
+            "errors": sum(1 for record in spans if record["status"] != "ok"),
+            "stages": per_source,
+            **self.fields,
+        }
+
+def start_run(kind="report"):
+    run = Run(kind)
+    _run.set(run)
+    with _write_lock:
+        _active_runs[run.run_id] = run
+    return run
+
+def current_run():
+    return _run.get()
+
+def finish_run():
+    # Writes the summary line (and the Prometheus textfile) and ends the run
+    run = _run.get()
+    _run.set(None)
+    if run is None:
+        return None
+    with _write_lock:
+        _active_runs.pop(run.run_id, None)
+    summary = run.summary()
+    _write_event(summary)
+    if METRICS_TEXTFILE:
+        try:
+            write_prometheus_textfile(summary, METRICS_TEXTFILE)
+        except OSError as e:
+            print(f"Could not write metrics file: {e}")
+    slowest = summary["slowest_stage"]
+    if slowest:
+        print(f"Run {run.run_id} took {summary['total_s']:.1f}s; slowest stage: {slowest['source'] or 'run'} {slowest['stage']} ({slowest['duration_s']:.1f}s)")
+    return summary
+
+def set_source(source):
+    # Attribute spans recorded in this context (one extractor worker) to a balance source
+    _source.set(source)
+
+def get_source():
+    return _source.get()
+
+@contextmanager
+def span(stage, source=None, **fields):
+    started = time.perf_counter()
+    status = "ok"
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        status = "error"
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        run = _run.get()
+        if run is not None:
+            record = {
+                "source": source or get_source(),
+                "stage": stage,
+                "start": round(started - run.started, 3),
+                "duration_s": round(time.perf_counter() - started, 3),
+                "status": status,
+            }
+            if error:
+                record["error"] = error[:300]
+            record.update(fields)
+            run.add_span(record)
+
+def record_span(run_id, stage, duration_s, status="ok", error=None, source=None, **fields):
+    # A span for run_id recorded from outside that run's context. While the run is still
+    # active it counts towards the run's summary; afterwards it is written to the log on its own.
+    if run_id is None:
+        return
+    record = {
+        "source": source,
+        "stage": stage,
+        "at": _utc_now(),
+        "duration_s": round(duration_s, 3),
+        "status": status,
+    }
+    if error:
+        record["error"] = error[:300]
+    record.update(fields)
+    with _write_lock:
+        run = _active_runs.get(run_id)
+    if run is not None:
+        run.add_span(record)
+    else:
+        _write_event({"type": "span", "run_id": run_id, **record})
+
+def increment(name, source=None, amount=1):
+    run = _run.get()
+    if run is not None:
+        run.increment(name, source or get_source(), amount)
+
+def annotate(**fields):
+    # Extra fields for the run summary (e.g. balances found)
+    run = _run.get()
+    if run is not None:
+        run.fields.update(fields)
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+def write_prometheus_textfile(summary, path):
+    # Node-exporter textfile format, replaced atomically
+    lines = [
+        "# HELP float_report_run_duration_seconds Wall time of the last run.",
+        "# TYPE float_report_run_duration_seconds gauge",
+        f'float_report_run_duration_seconds{{kind="{_label(summary["kind"])}"}} {summary["total_s"]}',
+        "# HELP float_report_stage_duration_seconds Time spent per stage in the last run.",
+        "# TYPE float_report_stage_duration_seconds gauge",
+    ]
+    for source, stages in summary["stages"].items():
+        for stage, duration in stages.items():
+            lines.append(f'float_report_stage_duration_seconds{{source="{_label(source)}",stage="{_label(stage)}"}} {duration}')
+    lines += [
+        "# HELP float_report_retries Retries per source in the last run.",
+        "# TYPE float_report_retries gauge",
+    ]
+    for source, count in summary["retries"].items():
+        lines.append(f'float_report_retries{{source="{_label(source)}"}} {count}')
+    lines += [
+        "# HELP float_report_errors Failed stages in the last run.",
+        "# TYPE float_report_errors gauge",
+        f"float_report_errors {summary['errors']}",
+        "# HELP float_report_last_run_timestamp_seconds Unix time the last run finished.",
+        "# TYPE float_report_last_run_timestamp_seconds gauge",
+        f"float_report_last_run_timestamp_seconds {time.time():.0f}",
+    ]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,324 @@
+import atexit
+import base64
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from dotenv import load_dotenv
+from instrumentation import current_run, record_span
+from resilience import RetryPolicy
+
+# Email delivery through a persistent on-disk outbox.
+# enqueue() writes the message to MAIL_OUTBOX_DIR and returns at once; a background
+# thread sends it through the configured transport, retrying with backoff until it
+# goes through. Messages left over by a previous process are picked up on start, so
+# a flaky mail API delays a report instead of dropping it.
+# MAIL_TRANSPORT: sendgrid (default), smtp, or file (writes .eml files, for tests).
+
+load_dotenv()
+SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
+FROM_EMAIL = os.getenv("SENDGRID_FROM_EMAIL")
+TO_EMAIL = [email.strip() for email in os.getenv("SENDGRID_TO_EMAIL", "").split(",") if email.strip()]
+MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "sendgrid").lower()
+MAIL_OUTBOX_DIR = os.getenv("MAIL_OUTBOX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".outbox"))
+MAIL_MAX_AGE = float(os.getenv("MAIL_MAX_AGE", str(3 * 24 * 3600)))  # Undelivered messages move to dead/ after this
+MAIL_FLUSH_TIMEOUT = float(os.getenv("MAIL_FLUSH_TIMEOUT", "30"))  # How long exit waits for pending mail
+MAIL_TIMEOUT = float(os.getenv("MAIL_TIMEOUT", "30"))
+# Only the backoff is used: age (MAIL_MAX_AGE), not the attempt count, decides when to give up
+RETRY_POLICY = RetryPolicy(
+    base_delay=float(os.getenv("MAIL_RETRY_DELAY", "10")),
+    max_delay=float(os.getenv("MAIL_RETRY_MAX_DELAY", "900")),
+)
+
+class SendGridTransport:
+    # SendGrid v3 mail/send over one keep-alive requests.Session
+    URL = "https://api.sendgrid.com/v3/mail/send"
+
+    def __init__(self, api_key=SENDGRID_API_KEY):
+        if not api_key:
+            raise ValueError("SENDGRID_API_KEY is not set")
+        self.api_key = api_key.strip('"')
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers["Authorization"] = f"Bearer {self.api_key}"
+        return self._session
+
+    def send(self, message):
+        payload = {
+            "personalizations": [{"to": [{"email": email} for email in message["to"]]}],
+            "from": {"email": message["from"]},
+            "subject": message["subject"],
+            "content": [
+                {"type": "text/plain", "value": message["text"]},
+                {"type": "text/html", "value": message["html"]},
+            ],
+        }
+        if message.get("attachments"):
+            payload["attachments"] = [
+                {"content": item["content"], "filename": item["filename"], "type": item["content_type"], "disposition": "attachment"}
+                for item in message["attachments"]
+            ]
+        response = self._get_session().post(self.URL, json=payload, timeout=MAIL_TIMEOUT)
+        if response.status_code >= 300:
+            raise RuntimeError(f"SendGrid returned {response.status_code}: {response.text[:200]}")
+        return response.status_code
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+class SmtpTransport:
+    # One SMTP connection kept open between messages; reconnects after an error
+    def __init__(self, host=None, port=None, username=None, password=None, starttls=None):
+        self.host = host or os.getenv("SMTP_HOST")
+        if not self.host:
+            raise ValueError("SMTP_HOST is not set")
+        self.port = int(port or os.getenv("SMTP_PORT", "587"))
+        self.username = username or os.getenv("SMTP_USERNAME")
+        self.password = password or os.getenv("SMTP_PASSWORD")
+        self.starttls = os.getenv("SMTP_STARTTLS", "1") not in ("0", "false", "no") if starttls is None else starttls
+        self._smtp = None
+
+    def _connect(self):
+        import smtplib
+        smtp = smtplib.SMTP(self.host, self.port, timeout=MAIL_TIMEOUT)
+        if self.starttls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password or "")
+        return smtp
+
+    def send(self, message):
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(build_mime(message))
+        except Exception:
+            self.close()
+            raise
+        return 250
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+class FileTransport:
+    # Writes each message as an .eml file instead of sending it
+    def __init__(self, directory=None):
+        self.directory = directory or os.getenv("MAIL_FILE_DIR", os.path.join(MAIL_OUTBOX_DIR, "delivered"))
+
+    def send(self, message):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f"{message['id']}.eml"), "wb") as f:
+            f.write(build_mime(message).as_bytes())
+        return 200
+
+    def close(self):
+        pass
+
+TRANSPORTS = {"sendgrid": SendGridTransport, "smtp": SmtpTransport, "file": FileTransport}
+
+def build_mime(message):
+    from email.message import EmailMessage
+    mime = EmailMessage()
+    mime["Subject"] = message["subject"]
+    mime["From"] = message["from"]
+    mime["To"] = ", ".join(message["to"])
+    mime["Message-ID"] = f"<{message['id']}@float-report>"
+    mime.set_content(message["text"])
+    mime.add_alternative(message["html"], subtype="html")
+    for item in message.get("attachments") or []:
+        maintype, subtype = item["content_type"].split("/", 1)
+        mime.add_attachment(base64.b64decode(item["content"]), maintype=maintype, subtype=subtype, filename=item["filename"])
+    return mime
+
+def configured():
+    # Sender, recipients and the transport's own credentials are all present
+    if not (FROM_EMAIL and TO_EMAIL):
+        return False
+    if MAIL_TRANSPORT == "sendgrid":
+        return bool(SENDGRID_API_KEY)
+    if MAIL_TRANSPORT == "smtp":
+        return bool(os.getenv("SMTP_HOST"))
+    return MAIL_TRANSPORT in TRANSPORTS
+
+class Mailer:
+    def __init__(self, transport=None, outbox_dir=MAIL_OUTBOX_DIR, policy=RETRY_POLICY, max_age=MAIL_MAX_AGE, clock=time.time):
+        self.transport = transport
+        self.outbox_dir = outbox_dir
+        self.policy = policy
+        self.max_age = max_age
+        self.clock = clock
+        self._wake = threading.Condition()
+        self._idle = threading.Event()
+        self._stopped = False
+        self._dirty = False  # A message arrived since the last pass
+        self._thread = None
+
+    def _get_transport(self):
+        if self.transport is None:
+            self.transport = TRANSPORTS[MAIL_TRANSPORT]()
+        return self.transport
+
+    def _path(self, message_id, folder=""):
+        return os.path.join(self.outbox_dir, folder, f"{message_id}.json")
+
+    def _write(self, message, folder=""):
+        path = self._path(message["id"], folder)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(message, f)
+        os.replace(tmp_path, path)
+
+    def enqueue(self, subject, text, html, to=None, sender=None, attachments=None):
+        # Persists the message and hands it to the background sender; returns its id.
+        # attachments: [(filename, content_type, bytes)]
+        now = self.clock()
+        run = current_run()
+        message = {
+            "id": f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}",
+            "subject": subject,
+            "text": text,
+            "html": html,
+            "to": list(to or TO_EMAIL),
+            "from": sender or FROM_EMAIL,
+            "created_at": now,
+            "run_id": run.run_id if run is not None else None,  # The send is logged against this run
+            "attempts": 0,
+            "next_attempt_at": now,
+            "last_error": None,
+            "attachments": [
+                {"filename": filename, "content_type": content_type, "content": base64.b64encode(content).decode("ascii")}
+                for filename, content_type, content in attachments or []
+            ],
+        }
+        self._write(message)
+        self.start()
+        with self._wake:
+            self._dirty = True
+            self._idle.clear()
+            self._wake.notify()
+        return message["id"]
+
+    def pending(self):
+        try:
+            names = sorted(name for name in os.listdir(self.outbox_dir) if name.endswith(".json"))
+        except FileNotFoundError:
+            return []
+        messages = []
+        for name in names:
+            try:
+                with open(os.path.join(self.outbox_dir, name)) as f:
+                    messages.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return messages
+
+    def deliver_due(self):
+        # One pass over the outbox; returns seconds until the next retry is due (None if empty)
+        next_due = None
+        for message in self.pending():
+            now = self.clock()
+            if now - message["created_at"] >= self.max_age:
+                print(f"❌ Giving up on email '{message['subject']}' after {message['attempts']} attempt(s): {message['last_error']}")
+                self._write(message, "dead")
+                os.remove(self._path(message["id"]))
+                continue
+            if message["next_attempt_at"] > now:
+                wait = message["next_attempt_at"] - now
+                next_due = wait if next_due is None else min(next_due, wait)
+                continue
+            message["attempts"] += 1
+            started = time.perf_counter()
+            try:
+                status = self._get_transport().send(message)
+            except Exception as e:
+                record_span(message.get("run_id"), "email_send", time.perf_counter() - started, status="error",
+                            error=f"{type(e).__name__}: {e}", attempt=message["attempts"])
+                delay = self.policy.delay(message["attempts"])
+                message["last_error"] = f"{type(e).__name__}: {e}"[:300]
+                message["next_attempt_at"] = self.clock() + delay
+                self._write(message)
+                print(f"Failed to send email (attempt {message['attempts']}): {e}; retrying in {delay:.0f}s")
+                next_due = delay if next_due is None else min(next_due, delay)
+                continue
+            record_span(message.get("run_id"), "email_send", time.perf_counter() - started, attempt=message["attempts"])
+            os.remove(self._path(message["id"]))
+            print(f"Email sent! Status code: {status} ({message['subject']})")
+        return next_due
+
+    def start(self):
+        with self._wake:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="mailer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            with self._wake:
+                self._dirty = False
+            try:
+                next_due = self.deliver_due()
+            except Exception as e:
+                print(f"Mailer error: {e}")
+                next_due = self.policy.base_delay
+            with self._wake:
+                if self._dirty:
+                    continue
+                if next_due is None:
+                    self._idle.set()
+                if self._stopped:
+                    break
+                self._wake.wait(timeout=next_due)
+
+    def flush(self, timeout=MAIL_FLUSH_TIMEOUT):
+        # Waits until the outbox is empty or timeout passes; True if everything was delivered
+        if not self.pending():
+            return True
+        self.start()
+        self._idle.wait(timeout)
+        return not self.pending()
+
+    def stop(self):
+        with self._wake:
+            self._stopped = True
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self.transport is not None:
+            self.transport.close()
+
+_mailer = None
+_mailer_lock = threading.Lock()
+
+def get_mailer():
+    # Process-wide mailer; the first call also resumes any mail left in the outbox
+    global _mailer
+    with _mailer_lock:
+        if _mailer is None:
+            _mailer = Mailer()
+            atexit.register(_shutdown)
+            if _mailer.pending():
+                _mailer.start()
+        return _mailer
+
+def _shutdown():
+    if _mailer is None:
+        return
+    if not _mailer.flush():
+        print(f"{len(_mailer.pending())} email(s) still in the outbox; they will be sent on the next start.")
+    _mailer.stop()
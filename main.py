@@ -1,48 +1,59 @@
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-import time
 import os
 from dotenv import load_dotenv
+from driver_pool import acquire_driver, release_driver
+from instrumentation import span
+from session_cache import restore_session, save_session, clear_session
+from waits import timeout_for, wait_for_element, wait_for_clickable, wait_for_any
 
 # Load credentials from .env file
 load_dotenv()
 USERNAME = os.getenv("V2_USERNAME")
 PASSWORD = os.getenv("V2_PASSWORD")
+WAIT_TIMEOUT = timeout_for("V2")
+V2_BASE_URL = os.getenv("V2_BASE_URL", "https://v2.ipps.co.th").rstrip("/")
 
-# Setup Chrome WebDriver
-def setup_driver():
-    options = Options()
-    options.add_argument("--headless")  # Enable headless mode
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    return webdriver.Chrome(options=options)
+LOGIN_FIELD = (By.ID, "email")
+BALANCE_LOCATOR = (By.XPATH, "//div[contains(@class, 'd-flex') and .//div[text()='E-Money']]//div[contains(text(), 'Balance:')]")
 
 # Login to V2 system
 def login_and_test_v2():
-    driver = setup_driver()
+    driver = acquire_driver(source="V2")
     try:
+        restored = restore_session(driver, "V2", USERNAME)
+
         print("Opening browser and navigating to login page...")
-        driver.get("https://v2.ipps.co.th/agents/login")
-        time.sleep(2)
+        with span("page_load", "V2"):
+            driver.get(f"{V2_BASE_URL}/agents/login")
+
+        # With a live cached session the portal redirects straight to the dashboard
+        balance_element = None
+        if restored:
+            found, element = wait_for_any(driver, [BALANCE_LOCATOR, LOGIN_FIELD], WAIT_TIMEOUT)
+            if found == 0:
+                print("✅ Cached session still valid, skipping login.")
+                balance_element = element
+            else:
+                print("Cached session expired, logging in again...")
+                clear_session("V2", USERNAME)
 
-        print("Filling in login credentials...")
-        driver.find_element(By.ID, "email").send_keys(USERNAME)
-        driver.find_element(By.ID, "password").send_keys(PASSWORD)
+        if balance_element is None:
+            with span("login", "V2"):
+                print("Filling in login credentials...")
+                wait_for_element(driver, LOGIN_FIELD, WAIT_TIMEOUT).send_keys(USERNAME)
+                driver.find_element(By.ID, "password").send_keys(PASSWORD)
 
-        print("Clicking login button...")
-        driver.find_element(By.XPATH, "//button[@type='submit' and contains(., 'Login')]").click()
-        time.sleep(3)
+                print("Clicking login button...")
+                wait_for_clickable(driver, (By.XPATH, "//button[@type='submit' and contains(., 'Login')]"), WAIT_TIMEOUT).click()
 
-        # Get E-Money balance using precise structure
-        balance_element = driver.find_element(
-            By.XPATH,
-            "//div[contains(@class, 'd-flex') and .//div[text()='E-Money']]//div[contains(text(), 'Balance:')]"
-        )
+                # Get E-Money balance using precise structure (appears once the dashboard has loaded)
+                balance_element = wait_for_element(driver, BALANCE_LOCATOR, WAIT_TIMEOUT)
+                save_session(driver, "V2", USERNAME)
 
-        text = balance_element.text.strip()  # e.g. "Balance: 241.67 THB"
-        balance_str = text.replace("Balance:", "").replace("THB", "").strip()
-        balance_value = float(balance_str)
+        with span("parse", "V2"):
+            text = balance_element.text.strip()  # e.g. "Balance: 241.67 THB"
+            balance_str = text.replace("Balance:", "").replace("THB", "").strip()
+            balance_value = float(balance_str)
 
         print(f"✅ Extracted E-Money Balance: {balance_value} THB")
         return balance_value  # <-- Return the value
@@ -51,7 +62,7 @@ def login_and_test_v2():
         print("❌ Error during login or scraping:", e)
         return None
     finally:
-        driver.quit()
+        release_driver(driver)
 
 # Run the test
 if __name__ == "__main__":
@@ -1,151 +1,171 @@
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from datetime import datetime, timedelta
-import time
 import os
 from dotenv import load_dotenv
-import pandas as pd  # For parsing Excel
-import glob  # For finding downloaded files
+from selenium.common.exceptions import TimeoutException
+import downloads
+from driver_pool import acquire_driver, release_driver
+from instrumentation import span
+from report_parser import read_vas_balance
+from session_cache import restore_session, save_session, clear_session
+from waits import timeout_for, wait_for_element, wait_for_clickable, wait_for_url_change, wait_for_any
 
 # Load environment variables
 load_dotenv()
 VAS_USERNAME = os.getenv("VAS_USERNAME")
 VAS_PASSWORD = os.getenv("VAS_PASSWORD")
-
-# Setup Chrome WebDriver with custom download directory
-def setup_driver(download_dir=None):
-    options = Options()
-    options.add_argument("--headless")  # Enable headless mode
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-
-    # Set up Chrome preferences
-    prefs = {
-        "credentials_enable_service": False,
-        "profile.password_manager_enabled": False,
-        "profile.password_manager_leak_detection": False
-    }
-    if download_dir:
-        prefs["download.default_directory"] = os.path.abspath(download_dir)
-        prefs["download.prompt_for_download"] = False
-        prefs["directory_upgrade"] = True
-        prefs["safebrowsing.enabled"] = True
-    options.add_experimental_option("prefs", prefs)
-
-    # Optional: disable the popup warning UI entirely
-    options.add_argument("--disable-notifications")
-    options.add_argument("--disable-infobars")
-    options.add_argument("--disable-popup-blocking")
-
-    return webdriver.Chrome(options=options)
-
-# Login to VAS and select previous day's report and download/parse report
-def login_vas():
-    download_dir = "downloads"
-    os.makedirs(download_dir, exist_ok=True)
-    driver = setup_driver(download_dir=download_dir)
-    try:
-        print("Navigating to VAS login...")
-        driver.get("https://va-vasbo.ipps.co.th/vas-web/auth/login")
-        time.sleep(2)
-
-        driver.find_element(By.ID, "usernameforshow").send_keys(VAS_USERNAME)
+WAIT_TIMEOUT = timeout_for("VAS")
+DOWNLOAD_TIMEOUT = float(os.getenv("VAS_DOWNLOAD_TIMEOUT", "30"))
+
+VAS_BASE_URL = os.getenv("VAS_BASE_URL", "https://va-vasbo.ipps.co.th").rstrip("/")
+LOGIN_URL = f"{VAS_BASE_URL}/vas-web/auth/login"
+REPORT_URL = f"{VAS_BASE_URL}/vas-web/report/amc_all_report/"
+LOGIN_FIELD = (By.ID, "usernameforshow")
+DATE_FIELD = (By.ID, "businessDate")
+
+def _login(driver):
+    print("Navigating to VAS login...")
+    with span("page_load", "VAS"):
+        driver.get(LOGIN_URL)
+
+    with span("login", "VAS"):
+        wait_for_element(driver, LOGIN_FIELD, WAIT_TIMEOUT).send_keys(VAS_USERNAME)
         driver.find_element(By.ID, "passwordforshow").send_keys(VAS_PASSWORD)
-        driver.find_element(By.ID, "buttonforshow").click()
-        time.sleep(3)
-
-        print("Redirecting to report page...")
-        driver.get("https://va-vasbo.ipps.co.th/vas-web/report/amc_all_report/")
-        time.sleep(2)
-
-        # Select previous day's date
-        yesterday = (datetime.now() - timedelta(days=1)).strftime("%d/%m/%Y")
-        print(f"Selecting report date: {yesterday}")
-
-        date_input = driver.find_element(By.ID, "businessDate")
-        driver.execute_script(f"arguments[0].value = '{yesterday}'", date_input)
+        login_url = driver.current_url
+        wait_for_clickable(driver, (By.ID, "buttonforshow"), WAIT_TIMEOUT).click()
+        # Login is done once the portal navigates away from the login form
+        wait_for_url_change(driver, login_url, WAIT_TIMEOUT)
+    save_session(driver, "VAS", VAS_USERNAME)
+
+def _open_report_page(driver):
+    # Go straight to the report page with a cached session; fall back to a full login
+    if restore_session(driver, "VAS", VAS_USERNAME):
+        with span("page_load", "VAS"):
+            driver.get(REPORT_URL)
+            found, _ = wait_for_any(driver, [DATE_FIELD, LOGIN_FIELD], WAIT_TIMEOUT)
+        if found == 0:
+            print("✅ Cached session still valid, skipping login.")
+            return
+        print("Cached session expired, logging in again...")
+        clear_session("VAS", VAS_USERNAME)
+
+    _login(driver)
+    print("Redirecting to report page...")
+    with span("navigation", "VAS"):
+        driver.get(REPORT_URL)
+
+def _queue_download(driver, business_date):
+    # Searches one business date and clicks its UserAcccountStatReport download.
+    # Returns the path the file will land at, or None if the report row isn't there.
+    # Doesn't wait for the download, so several dates can download at once.
+    report_date = business_date.strftime("%d/%m/%Y")
+    file_date = business_date.strftime("%Y%m%d")
+    expected_filename = f"UserAcccountStatReport_{file_date}.xlsx"
+    print(f"Selecting report date: {report_date}")
+
+    with span("navigation", "VAS"):
+        date_input = wait_for_element(driver, DATE_FIELD, WAIT_TIMEOUT)
+        driver.execute_script("arguments[0].value = arguments[1]", date_input, report_date)
 
         # Click Search
         search_button = driver.find_element(By.XPATH, "//button[contains(text(), 'Search')]")
         search_button.click()
-        print("✅ Search triggered for previous day.")
+        print(f"✅ Search triggered for {report_date}.")
 
-        # Wait for the result to appear
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//td[contains(text(), '.csv') or contains(text(), 'Report')]") )
-        )
+        # Wait for this date's result to appear (the previous search's rows go stale first)
+        wait_for_element(driver, (By.XPATH, f"//td[contains(text(), '{file_date}')]"), WAIT_TIMEOUT)
         print("✅ Report result appeared (next step: download).")
 
-        # Step 1: Build expected filename
-        file_date = (datetime.now() - timedelta(days=1)).strftime("%Y%m%d")
-        expected_filename = f"UserAcccountStatReport_{file_date}.xlsx"
-
-        # Step 2: Find all rows in the report table
-        rows = driver.find_elements(By.XPATH, "//table//tr")
-
-        # DEBUG: Print all table row texts
-        print("DEBUG: Table rows found:")
-        for idx, row in enumerate(rows):
-            print(f"Row {idx}: {row.text}")
-        # Save screenshot for visual debug
-        driver.save_screenshot('vas_report_table.png')
-
-        downloaded = False
-        # Relaxed matching: look for report prefix and date
-        file_date = (datetime.now() - timedelta(days=1)).strftime("%Y%m%d")
-        for row in rows:
-            try:
-                if ("UserAcccountStatReport" in row.text and file_date in row.text):
-                    print(f"✅ Found row with report (partial match): {row.text}")
-                    # Find the download icon and click it, wait until clickable
-                    download_icon = row.find_element(By.XPATH, ".//i[contains(@class, 'fa-file-o')]")
-                    WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, ".//i[contains(@class, 'fa-file-o')]") ))
-                    download_icon.click()
-                    downloaded = True
-                    print("⏳ Downloading report...")
-                    break
-            except Exception as e:
-                continue
-        # Only print and return error if NO row was found
-        if not downloaded:
-            print(f"❌ Could not find report row for {expected_filename}")
-            driver.quit()
-            return None
-
-        # Step 3: Wait for the file to finish downloading
-        downloaded_file_path = os.path.join(download_dir, expected_filename)
-        timeout = 30  # seconds
-        waited = 0
-        while waited < timeout:
-            # Check if file exists and is not a .crdownload
-            if os.path.exists(downloaded_file_path) and not any(glob.glob(downloaded_file_path + ".crdownload")):
-                print(f"✅ Download complete: {downloaded_file_path}")
-                break
-            time.sleep(1)
-            waited += 1
-        else:
-            print(f"❌ Download timed out for {expected_filename}")
-            driver.quit()
-            return None
-
-        # Step 4: Parse Excel file to extract value from cell B15
+    # Find all rows in the report table
+    rows = driver.find_elements(By.XPATH, "//table//tr")
+    # Relaxed matching: look for report prefix and date
+    for row in rows:
         try:
-            df = pd.read_excel(downloaded_file_path, header=None)  # Read without headers for fixed cell
-            value = df.iloc[14, 1]  # Row 15 (index 14), Column B (index 1)
-            print(f"✅ Extracted VAS Balance: {value} THB")
-            return value
+            if ("UserAcccountStatReport" in row.text and file_date in row.text):
+                print(f"✅ Found row with report (partial match): {row.text}")
+                # Find the download icon and click it, wait until clickable
+                download_icon = row.find_element(By.XPATH, ".//i[contains(@class, 'fa-file-o')]")
+                wait_for_clickable(driver, download_icon, WAIT_TIMEOUT).click()
+                print("⏳ Downloading report...")
+                return expected_filename
         except Exception as e:
-            print(f"❌ Error parsing Excel file: {e}")
-            return None
+            continue
+
+    # DEBUG: Print all table row texts
+    print(f"❌ Could not find report row for {expected_filename}")
+    print("DEBUG: Table rows found:")
+    for idx, row in enumerate(rows):
+        print(f"Row {idx}: {row.text}")
+    # Save screenshot for visual debug
+    driver.save_screenshot('vas_report_table.png')
+    return None
+
+def download_vas_reports(business_dates, download_dir=None):
+    # One login for any number of business dates: every download is queued first,
+    # then all of them are awaited together. Returns {date: file path or None}.
+    # Files land in this run's own directory (see downloads.py) unless download_dir is given.
+    download_dir = download_dir or downloads.run_dir("VAS")
+    driver = acquire_driver(download_dir=download_dir, source="VAS")
+    try:
+        _open_report_page(driver)
+        queued = {}
+        for business_date in business_dates:
+            try:
+                queued[business_date] = _queue_download(driver, business_date)
+            except TimeoutException:
+                print(f"❌ No report result for {business_date:%d/%m/%Y}")
+                queued[business_date] = None
+
+        # Wait for every queued file to finish downloading (woken by filesystem events)
+        paths = {}
+        filenames = [name for name in queued.values() if name]
+        with span("download", "VAS", files=len(filenames)):
+            finished = downloads.wait_for_files(download_dir, filenames, DOWNLOAD_TIMEOUT)
+        for business_date, filename in queued.items():
+            paths[business_date] = None
+            if filename is None:
+                continue
+            downloaded_file_path = finished[filename]
+            if downloaded_file_path is None:
+                print(f"❌ Download timed out for {filename}")
+                continue
+            try:
+                downloads.verify(downloaded_file_path, "VAS", business_date)
+            except downloads.DownloadError as e:
+                print(f"❌ Downloaded report rejected: {e}")
+                continue
+            print(f"✅ Download complete: {downloaded_file_path}")
+            paths[business_date] = downloaded_file_path
+        return paths
 
     finally:
-        driver.quit()
+        release_driver(driver)
+
+def business_dates(start, end):
+    # Every date from start to end, inclusive
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
 
-# Run
+def vas_balances(start, end=None, download_dir=None):
+    # VAS balance per business date in [start, end], all in one browser session
+    paths = download_vas_reports(business_dates(start, end or start), download_dir)
+    return {business_date: (read_vas_balance(path) if path else None) for business_date, path in paths.items()}
+
+# Login to VAS and select previous day's report and download/parse report
+def login_vas():
+    yesterday = (datetime.now() - timedelta(days=1)).date()
+    downloaded_file_path = download_vas_reports([yesterday])[yesterday]
+    if downloaded_file_path is None:
+        return None
+    # Stream the Excel file up to the balance cell
+    return read_vas_balance(downloaded_file_path)
+
+# Run (optionally for a range of business dates: python main2.py 2026-09-01 2026-09-30)
 if __name__ == "__main__":
-    login_vas()
+    import sys
+    if len(sys.argv) > 1:
+        start = datetime.strptime(sys.argv[1], "%Y-%m-%d").date()
+        end = datetime.strptime(sys.argv[2], "%Y-%m-%d").date() if len(sys.argv) > 2 else start
+        for business_date, balance in vas_balances(start, end).items():
+            print(f"{business_date:%Y-%m-%d}: {balance if balance is not None else 'not found'}")
+    else:
+        login_vas()
@@ -1,182 +1,328 @@
 import os
+import threading
 import time
+from urllib.parse import urljoin
 from dotenv import load_dotenv
-from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import cimb_snapshot
+from driver_pool import acquire_driver, release_driver
+from extractors import get_registry
+from instrumentation import span
+from waits import timeout_for, wait_for_element, wait_for_clickable, wait_for_visible, wait_for_frame, wait_until, wait_for_staleness
 
 # Load environment variables
 load_dotenv()
 CIMB_COMPANY_ID = os.getenv("CIMB_COMPANY_ID")
 CIMB_USERNAME = os.getenv("CIMB_USERNAME")
 CIMB_PASSWORD = os.getenv("CIMB_PASSWORD")
+WAIT_TIMEOUT = timeout_for("CIMB")
+CIMB_BASE_URL = os.getenv("CIMB_BASE_URL", "https://www.bizchannel.cimbthai.com").rstrip("/")
+# A warm session (monitor mode) logs out after this long without a poll
+WARM_SESSION_MAX_IDLE = float(os.getenv("CIMB_WARM_SESSION_MAX_IDLE", "900"))
+# Accounts to read from Account Summary ("accounts" in sources.json, or CIMB_ACCOUNTS);
+# the first is the settlement account used in the report
+CIMB_ACCOUNTS = get_registry()["CIMB"].accounts
+# Read the frameset through DOM snapshots parsed locally (cimb_snapshot.py); 0 uses live element lookups only
+CIMB_SNAPSHOT = os.getenv("CIMB_SNAPSHOT", "1").lower() not in ("0", "false", "no")
+ACCOUNT_SUMMARY_ID = "subs8"  # Account Summary link in menuFrame
+BALANCE_LOCATOR = (By.XPATH, "//a[contains(@onclick, 'onViewLastTransaction(')]")
+# Every balance link of the Account Summary table in one round trip: [[onclick, text], ...]
+_BALANCE_LINKS_JS = """
+return Array.from(document.querySelectorAll("a[onclick*='onViewLastTransaction(']"))
+    .map(a => [a.getAttribute('onclick'), a.textContent]);
+"""
+LOGOUT_LOCATOR = (By.XPATH, "//a[contains(@href, 'action=logout') or @onclick='logout()']")
 
-# Setup Chrome WebDriver (reuse logic from main2.py)
-def setup_driver(download_dir=None):
-    options = Options()
-    options.add_argument("--headless")  # Enable headless mode
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    prefs = {
-        "credentials_enable_service": False,
-        "profile.password_manager_enabled": False,
-        "profile.password_manager_leak_detection": False
-    }
-    if download_dir:
-        prefs["download.default_directory"] = os.path.abspath(download_dir)
-        prefs["download.prompt_for_download"] = False
-        prefs["directory_upgrade"] = True
-        prefs["safebrowsing.enabled"] = True
-    options.add_experimental_option("prefs", prefs)
-    options.add_argument("--disable-notifications")
-    options.add_argument("--disable-infobars")
-    options.add_argument("--disable-popup-blocking")
-    return webdriver.Chrome(options=options)
-
-# CIMB login and balance extraction (stub - update selectors as needed)
-def login_and_get_cimb_balance():
-    driver = setup_driver()
-    try:
-        print("Navigating to CIMB login page...")
-        driver.get("https://www.bizchannel.cimbthai.com/corp/common2/login.do?action=loginRequest")
-        time.sleep(2)
-        print("Page title after loading login page:", driver.title)
-        print("Current URL:", driver.current_url)
-
-        print("\n[INFO] You may now manually press LOGOUT in the browser. Wait at least 10 seconds after the dashboard appears before logging out to ensure all debug info is printed.")
+def _login(driver):
+    # Fills and submits the login form; returns True once the frameset is loaded
+    print("Navigating to CIMB login page...")
+    with span("page_load", "CIMB"):
+        driver.get(f"{CIMB_BASE_URL}/corp/common2/login.do?action=loginRequest")
+    print("Page title after loading login page:", driver.title)
+    print("Current URL:", driver.current_url)
 
-        # Fill in CIMB login form with explicit error handling
-        try:
-            company_field = driver.find_element(By.ID, "corpId")
-            print("Found company ID field.")
-        except Exception as e:
-            print("❌ Could not find company ID field (corpId):", e)
-            return
-        try:
-            user_field = driver.find_element(By.ID, "userName")
-            print("Found username field.")
-        except Exception as e:
-            print("❌ Could not find username field (userName):", e)
-            return
-        try:
-            password_field = driver.find_element(By.ID, "passwordEncryption")
-            print("Found password field.")
-        except Exception as e:
-            print("❌ Could not find password field (passwordEncryption):", e)
-            return
-        try:
-            login_button = driver.find_element(By.NAME, "submit1")
-            print("Found login button.")
-        except Exception as e:
-            print("❌ Could not find login button (submit1):", e)
-            return
-        # Now fill and submit
+    # Fill in CIMB login form with explicit error handling
+    try:
+        company_field = wait_for_element(driver, (By.ID, "corpId"), WAIT_TIMEOUT)
+        print("Found company ID field.")
+    except Exception as e:
+        print("❌ Could not find company ID field (corpId):", e)
+        return False
+    try:
+        user_field = driver.find_element(By.ID, "userName")
+        print("Found username field.")
+    except Exception as e:
+        print("❌ Could not find username field (userName):", e)
+        return False
+    try:
+        password_field = driver.find_element(By.ID, "passwordEncryption")
+        print("Found password field.")
+    except Exception as e:
+        print("❌ Could not find password field (passwordEncryption):", e)
+        return False
+    try:
+        login_button = driver.find_element(By.NAME, "submit1")
+        print("Found login button.")
+    except Exception as e:
+        print("❌ Could not find login button (submit1):", e)
+        return False
+    # Now fill and submit
+    with span("login", "CIMB"):
         company_field.send_keys(CIMB_COMPANY_ID)
         user_field.send_keys(CIMB_USERNAME)
         password_field.send_keys(CIMB_PASSWORD)
         login_button.click()
-        print("Login submitted, waiting for dashboard...")
         print("Login submitted, waiting for dashboard to load...")
-        from selenium.common.exceptions import NoSuchElementException, TimeoutException
-        from selenium.webdriver.support.ui import WebDriverWait
-        from selenium.webdriver.support import expected_conditions as EC
         try:
-            # Wait for URL to change to 'returnMain'
-            WebDriverWait(driver, 20).until(
-                EC.url_contains("returnMain")
-            )
+            # Wait for URL to change to 'returnMain', or for the login page to come back with a message
+            outcome = wait_until(driver, _login_outcome, WAIT_TIMEOUT)
+            if outcome is not True:
+                print(f"❌ CIMB refused the login: {'; '.join(outcome)}")
+                return False
             print("✅ URL changed to dashboard. Now waiting for frameset...")
             # Wait for menuFrame to appear
-            WebDriverWait(driver, 20).until(
-                lambda d: len(d.find_elements(By.NAME, "menuFrame")) > 0
-            )
+            wait_for_element(driver, (By.NAME, "menuFrame"), WAIT_TIMEOUT)
             print("✅ Frameset loaded, proceeding to frame navigation.")
-            print("[WAIT] Dashboard loaded. Waiting 5 seconds...")
-            time.sleep(5)
         except Exception:
             print("❌ Dashboard did not load after login. Stopping.")
-            return None
+            return False
+    return True
 
-        # --- Frame switching logic ---
-        cimb_balance = None
-        try:
-            # 1. Switch to menuFrame to click menu items
-            driver.switch_to.default_content()
-            driver.switch_to.frame("menuFrame")
-            print("[WAIT] Switched to menuFrame. Waiting 5 seconds...")
-            time.sleep(5)
-            # Click 'Account Service & Information Management'
-            menu_div = driver.find_element(By.XPATH, "//div[contains(text(), 'Account Service')]")
+def _login_outcome(driver):
+    # True once the dashboard URL is reached, the portal's messages (e.g. "User is still login") if it answered with one
+    try:
+        if "returnMain" in driver.current_url:
+            return True
+        return cimb_snapshot.take_snapshot(driver).messages or False
+    except WebDriverException:
+        return False  # Page is between documents
+
+def _open_account_summary(driver):
+    # Clicks Account Summary in menuFrame and waits for mainFrame to show the new page
+    with span("navigation", "CIMB"):
+        driver.switch_to.default_content()
+        wait_for_frame(driver, "mainFrame", WAIT_TIMEOUT)
+        previous_page = driver.find_element(By.TAG_NAME, "html")
+        # 1. Switch to menuFrame to click menu items
+        driver.switch_to.default_content()
+        wait_for_frame(driver, "menuFrame", WAIT_TIMEOUT)
+        print("Switched to menuFrame.")
+        account_summary_links = driver.find_elements(By.ID, ACCOUNT_SUMMARY_ID)
+        # On a warm session the submenu is still expanded; clicking the menu again would collapse it
+        if not (account_summary_links and account_summary_links[0].is_displayed()):
+            menu_div = wait_for_clickable(driver, (By.XPATH, "//div[contains(text(), 'Account Service')]"), WAIT_TIMEOUT)
             menu_div.click()
             print("✅ Clicked 'Account Service & Information Management' menu.")
-            print("[WAIT] Clicked Account Service & Information Management. Waiting 5 seconds...")
-            time.sleep(5)
-            # Print all <a> links in menuFrame after expanding menu
-            links = driver.find_elements(By.TAG_NAME, "a")
-            print("[DEBUG] Links in menuFrame after expanding menu:")
-            for idx, link in enumerate(links):
-                print(f"  Link {idx}: '{link.text.strip()}' | href={link.get_attribute('href')}")
-            # Click 'Account Summary' using its id
-            account_summary_link = driver.find_element(By.ID, "subs8")
-            account_summary_link.click()
-            print("✅ Clicked 'Account Summary' link.")
-            print("[WAIT] Clicked Account Summary. Waiting 10 seconds...")
-            time.sleep(10)
-        except Exception:
-            print("❌ Could not find or click the menu or Account Summary in menuFrame.")
+        # Submenu is expanded once 'Account Summary' becomes clickable
+        account_summary_link = wait_for_clickable(driver, (By.ID, ACCOUNT_SUMMARY_ID), WAIT_TIMEOUT)
+        account_summary_link.click()
+        print("✅ Clicked 'Account Summary' link.")
+        # 2. Switch to mainFrame once the previous page is gone
+        driver.switch_to.default_content()
+        wait_for_frame(driver, "mainFrame", WAIT_TIMEOUT)
+        wait_for_staleness(driver, previous_page, WAIT_TIMEOUT)
+        print("Switched to mainFrame, waiting for Account Summary...")
+        # Account Summary has loaded once its first balance link is shown
+        wait_for_visible(driver, BALANCE_LOCATOR, WAIT_TIMEOUT)
+
+def parse_balance_links(links):
+    # {account: available balance} from [[onclick, text], ...] of the balance links
+    balances = {}
+    for onclick, text in links:
+        match = cimb_snapshot.ACCOUNT_PATTERN.search(onclick or "")
+        if not match:
+            continue
+        try:
+            balances[match.group(1)] = float(text.strip().replace(',', ''))
+        except ValueError:
+            continue
+    return balances
+
+def _summary_balances(driver):
+    # Balances once mainFrame holds a freshly loaded Account Summary (one round trip per poll)
+    try:
+        frame = cimb_snapshot.take_snapshot(driver, ["mainFrame"]).frame("mainFrame")
+    except WebDriverException:
+        return False
+    return (frame.loaded and frame.balances()) or False
+
+def _snapshot_balances(driver):
+    # Account Summary through DOM snapshots: mainFrame is pointed straight at the menu's
+    # Account Summary URL, then its HTML is polled and parsed locally. None when the
+    # menu link has no plain URL, so the caller clicks through the menu instead.
+    driver.switch_to.default_content()
+    with span("navigation", "CIMB", mode="snapshot"):
+        menu = cimb_snapshot.take_snapshot(driver, ["menuFrame"]).frame("menuFrame")
+        link = menu.link(ACCOUNT_SUMMARY_ID) if menu.html else None
+        if link is None or not link["href"] or link["href"].startswith(("#", "javascript:")):
+            print("Account Summary link has no plain URL, using the menu instead.")
             return None
+        cimb_snapshot.navigate_frame(driver, "mainFrame", urljoin(menu.url, link["href"]))
+        return wait_until(driver, _summary_balances, WAIT_TIMEOUT)
+
+def _read_balances(driver, accounts):
+    # Opens Account Summary and reads every account from the table in one pass.
+    # If the snapshot path doesn't bring up the balances (e.g. the portal needs the menu's
+    # own click handler), the menu is clicked through as before.
+    found = None
+    if CIMB_SNAPSHOT:
         try:
-            # 2. Switch to mainFrame to extract account and balance
-            driver.switch_to.default_content()
-            driver.switch_to.frame("mainFrame")
-            print("[WAIT] Switched to mainFrame. Waiting 5 seconds...")
-            time.sleep(5)
-            # Find the available balance for the account
-            balance_link = driver.find_element(By.XPATH, "//a[contains(@onclick, \"onViewLastTransaction('7013252356\")]")
-            balance_text = balance_link.text.strip().replace(',', '')
-            cimb_balance = float(balance_text)
-            print(f"✅ Extracted CIMB Available Balance: {cimb_balance} THB")
-            print("[WAIT] Extracted balance. Waiting 5 seconds...")
-            time.sleep(5)
-            # Attempt to logout via topFrame
-            try:
-                driver.switch_to.default_content()
-                driver.switch_to.frame("topFrame")
-                logout_link = driver.find_element(By.XPATH, "//a[contains(@href, 'action=logout') or @onclick='logout()']")
-                logout_link.click()
-                print("✅ Clicked logout link. Session closed.")
-            except Exception:
-                print("❌ Could not find or click the logout link. Please check manually.")
-        except Exception:
-            print("❌ Could not find or extract the account or balance in mainFrame.")
+            found = _snapshot_balances(driver)
+        except WebDriverException as e:
+            print(f"Account Summary did not load from its URL ({type(e).__name__}), using the menu instead...")
+    if not found:
+        _open_account_summary(driver)
+        with span("parse", "CIMB", accounts=len(accounts)):
+            found = parse_balance_links(driver.execute_script(_BALANCE_LINKS_JS))
+    balances = {account: found.get(account) for account in accounts}
+    for account, balance in balances.items():
+        if balance is None:
+            print(f"❌ Account {account} not found in Account Summary.")
+        else:
+            print(f"✅ Extracted CIMB Available Balance: {balance} THB (account {account})")
+    return balances
+
+def _logout(driver):
+    # Follow the logout link found in a snapshot; otherwise switch to topFrame or mainFrame to click it (try both)
+    if CIMB_SNAPSHOT:
         try:
-            # 3. Switch to topFrame or mainFrame to click logout (try both)
             driver.switch_to.default_content()
+            document, link = cimb_snapshot.take_snapshot(driver, ["topFrame", "mainFrame"]).logout_link()
+            if link is not None and link["href"] and not link["href"].startswith(("#", "javascript:")):
+                driver.get(urljoin(document.url, link["href"]))
+                print("✅ Followed logout link. Session closed.")
+                return
+        except WebDriverException as e:
+            print(f"Snapshot logout failed ({type(e).__name__}), clicking the link instead...")
+    try:
+        driver.switch_to.default_content()
+        try:
+            driver.switch_to.frame("topFrame")
+        except Exception:
             try:
-                driver.switch_to.frame("topFrame")
+                driver.switch_to.frame("mainFrame")
             except Exception:
-                try:
-                    driver.switch_to.frame("mainFrame")
-                except Exception:
-                    pass
-            logout_link = driver.find_element(By.XPATH, "//a[contains(@href, 'action=logout') or @onclick='logout()']")
-            logout_link.click()
-            print("✅ Clicked logout link. Session closed.")
+                pass
+        logout_link = driver.find_element(*LOGOUT_LOCATOR)
+        logout_link.click()
+        print("✅ Clicked logout link. Session closed.")
+    except Exception:
+        print("❌ Could not find or click the logout link. Please check manually.")
+
+def get_cimb_balances(accounts=None):
+    # Balances of several accounts with a single login; {account: balance or None}, or None if login failed
+    accounts = accounts or CIMB_ACCOUNTS
+    # The portal allows one login per user, so while a warm session is open it serves every request
+    if _warm_session is not None:
+        return _warm_session.balances(accounts)
+    driver = acquire_driver(source="CIMB")
+    try:
+        if not _login(driver):
+            return None
+        balances = None
+        try:
+            balances = _read_balances(driver, accounts)
         except Exception:
-            print("❌ Could not find or click the logout link. Please check manually.")
-        return cimb_balance
+            print("❌ Could not find or extract the account or balance in mainFrame.")
+        _logout(driver)
+        return balances
 
     except Exception as e:
         print("❌ Error during CIMB login or scraping:", e)
     finally:
-        # Do NOT close the browser automatically so user can inspect manually
-        pass
+        # Always hand the browser back so the pool resets or quits it
+        release_driver(driver)
+
+# CIMB login and balance extraction of the settlement account
+def login_and_get_cimb_balance():
+    balances = get_cimb_balances(CIMB_ACCOUNTS[:1])
+    return balances[CIMB_ACCOUNTS[0]] if balances else None
+
+class WarmSession:
+    # Keeps one logged-in browser between polls, so a poll is a menu click instead of a full login.
+    # Logs in again when the portal session has expired, and logs out after max_idle without a poll.
+    def __init__(self, max_idle=WARM_SESSION_MAX_IDLE):
+        self.max_idle = max_idle
+        self.driver = None
+        self._lock = threading.Lock()
+        self._idle_timer = None
+
+    def balances(self, accounts):
+        with self._lock:
+            self._cancel_idle_timer()
+            try:
+                if self.driver is not None:
+                    try:
+                        return _read_balances(self.driver, accounts)
+                    except Exception as e:
+                        print(f"Warm CIMB session lost ({type(e).__name__}), logging in again...")
+                        self._close()
+                self.driver = acquire_driver(source="CIMB")
+                started = time.monotonic()
+                if not _login(self.driver):
+                    self._close()
+                    return None
+                print(f"CIMB warm session opened in {time.monotonic() - started:.1f}s")
+                try:
+                    return _read_balances(self.driver, accounts)
+                except Exception:
+                    print("❌ Could not find or extract the account or balance in mainFrame.")
+                    self._close()
+                    return None
+            finally:
+                self._arm_idle_timer()
+
+    def close(self):
+        with self._lock:
+            self._cancel_idle_timer()
+            self._close()
+
+    def _close(self):
+        driver, self.driver = self.driver, None
+        if driver is None:
+            return
+        try:
+            _logout(driver)
+        finally:
+            release_driver(driver)
+
+    def _arm_idle_timer(self):
+        if self.driver is None or not self.max_idle:
+            return
+        self._idle_timer = threading.Timer(self.max_idle, self._expire)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _cancel_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _expire(self):
+        with self._lock:
+            if self.driver is not None:
+                print(f"CIMB warm session idle for {self.max_idle:.0f}s, logging out.")
+                self._close()
+
+_warm_session = None
+
+def open_warm_session(max_idle=WARM_SESSION_MAX_IDLE):
+    global _warm_session
+    if _warm_session is None:
+        _warm_session = WarmSession(max_idle)
+    return _warm_session
+
+def close_warm_session():
+    global _warm_session
+    session, _warm_session = _warm_session, None
+    if session is not None:
+        session.close()
 
 if __name__ == "__main__":
-    balance = login_and_get_cimb_balance()
-    if balance is not None:
-        print(f"\nCIMB Available Balance: {balance:,.2f} THB")
+    balances = get_cimb_balances()
+    if balances:
+        for account, balance in balances.items():
+            print(f"\nCIMB Available Balance ({account}): " + (f"{balance:,.2f} THB" if balance is not None else "not found"))
     else:
         print("\nNo CIMB balance found.")
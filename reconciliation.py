@@ -0,0 +1,100 @@
+import ast
+import operator
+
+# The reconciliation formula as a configurable expression over source names,
+# e.g. "CIMB - (V2 + VAS)". Expressions are parsed once and checked against a
+# small whitelist (numbers, source names, + - * /, parentheses); nothing is
+# passed to eval, so a config file can't run code.
+
+DEFAULT_EXPRESSION = "CIMB - (V2 + VAS)"
+
+_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+class Reconciliation:
+    def __init__(self, expression=DEFAULT_EXPRESSION):
+        self.expression = " ".join(expression.split())
+        try:
+            tree = ast.parse(self.expression, mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Invalid reconciliation expression '{expression}': {e.msg}") from None
+        self.sources = []
+        self._check(tree.body)
+        self._tree = tree.body
+        # Sources added to / subtracted from the result, when the expression is a plain sum
+        self.assets, self.liabilities = self._terms(tree.body) or (None, None)
+
+    def _check(self, node):
+        if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+            self._check(node.left)
+            self._check(node.right)
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in _OPERATORS:
+            self._check(node.operand)
+        elif isinstance(node, ast.Name):
+            if node.id not in self.sources:
+                self.sources.append(node.id)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            pass
+        else:
+            raise ValueError(f"Unsupported element in reconciliation expression '{self.expression}': {ast.dump(node)[:60]}")
+
+    def _terms(self, node, sign=1):
+        # ([names with +], [names with -]) for expressions made of + and - only; None otherwise
+        if isinstance(node, ast.Name):
+            return ([node.id], []) if sign > 0 else ([], [node.id])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+            return self._terms(node.operand, -sign if isinstance(node.op, ast.USub) else sign)
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)):
+            left = self._terms(node.left, sign)
+            right = self._terms(node.right, -sign if isinstance(node.op, ast.Sub) else sign)
+            if None in (left, right):
+                return None
+            return left[0] + right[0], left[1] + right[1]
+        if isinstance(node, ast.Constant):
+            return [], []  # A fixed buffer keeps the expression a plain sum
+        return None
+
+    @property
+    def linear(self):
+        return self.assets is not None
+
+    def evaluate(self, balances):
+        # Result for {source: balance}, or None if a balance the expression needs is missing
+        if any(balances.get(name) is None for name in self.sources):
+            return None
+        try:
+            return self._eval(self._tree, balances)
+        except ZeroDivisionError:
+            return None
+
+    def _eval(self, node, balances):
+        if isinstance(node, ast.BinOp):
+            return _OPERATORS[type(node.op)](self._eval(node.left, balances), self._eval(node.right, balances))
+        if isinstance(node, ast.UnaryOp):
+            return _OPERATORS[type(node.op)](self._eval(node.operand, balances))
+        if isinstance(node, ast.Name):
+            return float(balances[node.id])
+        return node.value
+
+    def summary(self, result):
+        # One-line verdict for the report
+        if result is None:
+            return "One or more balances could not be extracted. Please check logs."
+        if self.linear and len(self.assets) >= 1 and self.liabilities:
+            assets = " and ".join(self.assets)
+            liabilities = " and ".join(self.liabilities)
+            if result >= 0:
+                return f"{assets} balance is sufficient. Surplus: {result:,.2f} THB."
+            return f"Warning: Combined {liabilities} float exceeds {assets} account by {abs(result):,.2f} THB!"
+        if result >= 0:
+            return f"Reconciliation is in surplus: {result:,.2f} THB."
+        return f"Warning: Reconciliation shows a shortfall of {abs(result):,.2f} THB!"
+
+    def __repr__(self):
+        return f"Reconciliation('{self.expression}')"
@@ -0,0 +1,308 @@
+import csv
+import io
+import json
+from html import escape
+from string import Template
+
+# Report rendering from one data model (Report) into text, HTML, CSV, XLSX and JSON.
+# Templates are compiled once at import; a source row is one template, so a new
+# balance source needs no template changes. The digest and CSV/XLSX/JSON renderers take
+# any number of business dates at once (backfills, weekly digests):
+#   python rendering.py --days 7 --format html --output digest.html
+
+def _reconciliation():
+    from extractors import get_registry
+    return get_registry().reconciliation
+
+class Report:
+    def __init__(self, business_date, balances, net=None, trend=None, reconciliation=None):
+        self.business_date = str(business_date)
+        self.balances = dict(balances)  # source -> balance (None when it could not be extracted)
+        self.net = net
+        self.trend = trend  # balance_store daily row, or None
+        self.reconciliation = reconciliation or _reconciliation()
+
+    @property
+    def label(self):
+        return self.reconciliation.expression
+
+    @property
+    def complete(self):
+        return None not in self.balances.values()
+
+    @property
+    def status(self):
+        # "ok" (surplus), "warn" (shortfall) or "error" (a balance is missing)
+        if self.net is None:
+            return "error"
+        return "ok" if self.net >= 0 else "warn"
+
+    @property
+    def summary(self):
+        return self.reconciliation.summary(self.net)
+
+    @property
+    def subject(self):
+        return f"Daily Float Reconciliation Report for {self.business_date}"
+
+    def to_dict(self):
+        return {
+            "business_date": self.business_date,
+            "balances": self.balances,
+            "reconciliation": self.label,
+            "net": self.net,
+            "status": self.status,
+            "summary": self.summary,
+            "trend": None if self.trend is None else {
+                key: self.trend.get(key) for key in ("delta", "ma7", "n7", "ma30", "n30", "std30", "flags")
+            },
+        }
+
+def build_report(balances, business_date, trend=None):
+    reconciliation = _reconciliation()
+    return Report(business_date, balances, net=reconciliation.evaluate(balances), trend=trend, reconciliation=reconciliation)
+
+def _amount(value, unit=""):
+    return "n/a" if value is None else f"{value:,.2f}{unit}"
+
+def _change(value, unit=""):
+    return "n/a" if value is None else f"{value:+,.2f}{unit}"
+
+# --- Text ---
+
+_TEXT = Template("""
+Daily Float Reconciliation Report
+
+$rows$reconciliation$trend""")
+_TEXT_ROW = Template("$source Balance: $value\n")
+_TEXT_NET = Template("\n$label = $net THB\n\n$summary")
+_TEXT_TREND = Template("""
+
+Trend ($label):
+Change vs previous day: $delta
+7-day average: $ma7 ($n7 day(s))
+30-day average: $ma30 ($n30 day(s))
+Flags: $flags
+""")
+
+def _has_trend(report):
+    return report.trend is not None and report.trend.get("net") is not None
+
+def _trend_values(report, unit=""):
+    # unit follows each amount, and is left out where there is no value ("n/a")
+    trend = report.trend
+    return {
+        "label": report.label,
+        "delta": _change(trend["delta"], unit),
+        "ma7": _amount(trend["ma7"], unit),
+        "n7": trend["n7"],
+        "ma30": _amount(trend["ma30"], unit),
+        "n30": trend["n30"],
+        "flags": trend["flags"] or "none",
+    }
+
+def render_text(report):
+    rows = "".join(
+        _TEXT_ROW.substitute(source=source, value="ERROR" if value is None else f"{value:,.2f} THB")
+        for source, value in report.balances.items()
+    )
+    if report.net is None:
+        reconciliation = f"\n{report.summary}\n"
+    else:
+        reconciliation = _TEXT_NET.substitute(label=report.label, net=f"{report.net:,.2f}", summary=report.summary)
+    trend = _TEXT_TREND.substitute(_trend_values(report, " THB")) if _has_trend(report) else ""
+    return _TEXT.substitute(rows=rows, reconciliation=reconciliation, trend=trend)
+
+# --- HTML ---
+
+_HTML = Template("""
+<html>
+  <head>
+    <style>
+      body { font-family: Arial, sans-serif; }
+      .report-table { border-collapse: collapse; width: 400px; margin: 18px 0; }
+      .report-table th, .report-table td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+      .report-table th { background-color: #f2f2f2; font-weight: bold; }
+      .ok { color: #228B22; font-weight: bold; }
+      .warn { color: #B22222; font-weight: bold; }
+      .error { color: #B22222; font-weight: bold; }
+    </style>
+  </head>
+  <body>
+$body
+</body></html>""")
+_HTML_REPORT = Template("""    <h2>Daily Float Reconciliation Report for $business_date</h2>
+    <table class="report-table">
+      <tr><th>Account</th><th>Balance (THB)</th></tr>
+$rows    </table>
+$reconciliation$trend""")
+_HTML_ROW = Template("      <tr><td>$source</td><td>$value</td></tr>\n")
+_HTML_NET = Template('<p class="$status">$label = $net THB</p><p class="$status">$summary</p>')
+_HTML_TREND = Template("""
+    <h3>Trend ($label)</h3>
+    <table class="report-table">
+      <tr><td>Change vs previous day</td><td>$delta</td></tr>
+      <tr><td>7-day average</td><td>$ma7</td></tr>
+      <tr><td>30-day average</td><td>$ma30</td></tr>
+      <tr><td>Flags</td><td><span class="$flag_class">$flags</span></td></tr>
+    </table>
+""")
+_HTML_ERROR = '<span class="error">ERROR</span>'
+_HTML_DIGEST = Template("""    <h2>Float Reconciliation Digest, $first to $last</h2>
+    <table class="report-table">
+      <tr><th>Business date</th>$headers<th>$label</th><th>Flags</th></tr>
+$rows    </table>
+""")
+_HTML_DIGEST_ROW = Template("      <tr><td>$business_date</td>$cells<td class=\"$status\">$net</td><td>$flags</td></tr>\n")
+
+def _html_report_body(report):
+    rows = "".join(
+        _HTML_ROW.substitute(source=escape(source), value=_HTML_ERROR if value is None else f"{value:,.2f}")
+        for source, value in report.balances.items()
+    )
+    if report.net is None:
+        reconciliation = f'<p class="error">{report.summary}</p>'
+    else:
+        reconciliation = _HTML_NET.substitute(
+            status=report.status, label=escape(report.label), net=f"{report.net:,.2f}", summary=escape(report.summary)
+        )
+    trend = ""
+    if _has_trend(report):
+        values = {key: escape(str(value)) for key, value in _trend_values(report).items()}
+        values["flag_class"] = "warn" if report.trend["flags"] else "ok"
+        trend = _HTML_TREND.substitute(values)
+    return _HTML_REPORT.substitute(business_date=escape(report.business_date), rows=rows, reconciliation=reconciliation, trend=trend)
+
+def render_html(report):
+    return _HTML.substitute(body=_html_report_body(report))
+
+def render_digest_html(reports):
+    # One table row per business date, for backfills and weekly digests
+    reports = list(reports)
+    sources = _sources(reports)
+    rows = "".join(
+        _HTML_DIGEST_ROW.substitute(
+            business_date=escape(report.business_date),
+            cells="".join(
+                f"<td>{_HTML_ERROR if report.balances.get(source) is None else f'{report.balances[source]:,.2f}'}</td>"
+                for source in sources
+            ),
+            status=report.status,
+            net=_amount(report.net),
+            flags=escape((report.trend or {}).get("flags") or ""),
+        )
+        for report in reports
+    )
+    body = _HTML_DIGEST.substitute(
+        first=escape(reports[0].business_date) if reports else "",
+        last=escape(reports[-1].business_date) if reports else "",
+        headers="".join(f"<th>{escape(source)}</th>" for source in sources),
+        label=escape(reports[0].label if reports else _reconciliation().expression),
+        rows=rows,
+    )
+    return _HTML.substitute(body=body)
+
+# --- Tabular (CSV / XLSX / JSON), any number of dates ---
+
+def _sources(reports):
+    sources = []
+    for report in reports:
+        sources.extend(source for source in report.balances if source not in sources)
+    return sources
+
+def _table(reports):
+    # Header and one row per report, shared by CSV and XLSX
+    reports = list(reports)
+    sources = _sources(reports)
+    header = ["business_date"] + sources + ["net", "status", "delta", "ma7", "ma30", "flags"]
+    rows = []
+    for report in reports:
+        trend = report.trend or {}
+        rows.append(
+            [report.business_date] + [report.balances.get(source) for source in sources]
+            + [report.net, report.status, trend.get("delta"), trend.get("ma7"), trend.get("ma30"), trend.get("flags") or ""]
+        )
+    return header, rows
+
+def render_csv(reports):
+    header, rows = _table(reports)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows(["" if value is None else value for value in row] for row in rows)
+    return buffer.getvalue()
+
+def render_xlsx(reports):
+    # Workbook bytes; write-only mode streams rows instead of building the sheet in memory
+    from openpyxl import Workbook
+    header, rows = _table(reports)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Float")
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def render_json(reports):
+    return json.dumps([report.to_dict() for report in reports], indent=2, default=str)
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def attachments(reports, formats):
+    # Mail attachments for the given formats ("csv", "xlsx", "json"): [(filename, content_type, bytes)]
+    reports = list(reports)
+    if not reports:
+        return []
+    stem = f"float_report_{reports[0].business_date}" + (f"_{reports[-1].business_date}" if len(reports) > 1 else "")
+    renderers = {
+        "csv": ("text/csv", lambda: render_csv(reports).encode("utf-8")),
+        "xlsx": (XLSX_CONTENT_TYPE, lambda: render_xlsx(reports)),
+        "json": ("application/json", lambda: render_json(reports).encode("utf-8")),
+    }
+    files = []
+    for fmt in formats:
+        if fmt in renderers:
+            content_type, render = renderers[fmt]
+            files.append((f"{stem}.{fmt}", content_type, render()))
+    return files
+
+def reports_from_history(rows):
+    # Reports for balance_store.history() rows, e.g. to render a digest of past days
+    from balance_store import row_balances
+    return [Report(row["business_date"], row_balances(row), net=row["net"], trend=row) for row in rows]
+
+def main():
+    import argparse
+    import sys
+    from datetime import date, timedelta
+    import balance_store
+    parser = argparse.ArgumentParser(description="Render stored balances for a range of business dates")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--since", help="start date, YYYY-MM-DD (overrides --days)")
+    parser.add_argument("--until", help="end date, YYYY-MM-DD")
+    parser.add_argument("--format", choices=("text", "html", "csv", "xlsx", "json"), default="text")
+    parser.add_argument("--output", help="file to write (default stdout; required for xlsx)")
+    args = parser.parse_args()
+
+    start = args.since or (date.today() - timedelta(days=args.days)).isoformat()
+    reports = reports_from_history(balance_store.history(start, args.until))
+    if args.format == "xlsx":
+        if not args.output:
+            parser.error("--output is required for xlsx")
+        content = render_xlsx(reports)
+    elif args.format == "html":
+        content = render_digest_html(reports)
+    elif args.format == "text":
+        content = "\n".join(render_text(report) for report in reports)
+    else:
+        content = {"csv": render_csv, "json": render_json}[args.format](reports)
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(content if isinstance(content, bytes) else content.encode("utf-8"))
+    else:
+        sys.stdout.write(content)
+
+if __name__ == "__main__":
+    main()
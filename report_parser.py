@@ -0,0 +1,79 @@
+import os
+from openpyxl import load_workbook
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string
+from dotenv import load_dotenv
+from instrumentation import span
+
+# Streaming reads of single values from downloaded xlsx reports.
+# Workbooks are opened read-only and rows are read only until the target is found,
+# so parse time stays flat as the report grows.
+
+load_dotenv()
+# Label of the balance row in UserAcccountStatReport_*.xlsx; the balance is the
+# first number to the right of it. Falls back to the fixed cell when unset or not found.
+VAS_BALANCE_LABEL = os.getenv("VAS_BALANCE_LABEL", "")
+VAS_BALANCE_CELL = os.getenv("VAS_BALANCE_CELL", "B15")
+MAX_SCAN_ROWS = int(os.getenv("REPORT_MAX_SCAN_ROWS", "500"))
+
+def _normalize(text):
+    return " ".join(str(text).split()).lower()
+
+def read_cell(file_path, coordinate):
+    # Value of one cell (e.g. "B15"), reading rows only up to that cell
+    column_letter, row = coordinate_from_string(coordinate)
+    column = column_index_from_string(column_letter)
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for values in wb.active.iter_rows(min_row=row, max_row=row, min_col=column, max_col=column, values_only=True):
+            return values[0]
+        return None
+    finally:
+        wb.close()
+
+def find_value_by_label(file_path, label, max_rows=MAX_SCAN_ROWS):
+    # First numeric value to the right of the cell whose text matches label.
+    # Returns (value, coordinate) or (None, None); stops at the matching row.
+    wanted = _normalize(label)
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(max_row=max_rows):
+            for idx, cell in enumerate(row):
+                if cell.value is None or _normalize(cell.value) != wanted:
+                    continue
+                for value_cell in row[idx + 1:]:
+                    if isinstance(value_cell.value, (int, float)) or _looks_numeric(value_cell.value):
+                        return value_cell.value, value_cell.coordinate
+                return None, None
+        return None, None
+    finally:
+        wb.close()
+
+def _looks_numeric(value):
+    if not isinstance(value, str):
+        return False
+    try:
+        float(value.replace(",", ""))
+        return True
+    except ValueError:
+        return False
+
+def read_vas_balance(file_path, label=None, fallback_cell=None):
+    label = VAS_BALANCE_LABEL if label is None else label
+    fallback_cell = fallback_cell or VAS_BALANCE_CELL
+    try:
+        with span("parse", "VAS"):
+            return _read_vas_balance(file_path, label, fallback_cell)
+    except Exception as e:
+        print(f"❌ Error parsing Excel file: {e}")
+        return None
+
+def _read_vas_balance(file_path, label, fallback_cell):
+    if label:
+        value, coordinate = find_value_by_label(file_path, label)
+        if coordinate is not None:
+            print(f"✅ Extracted VAS Balance: {value} THB ('{label}' at {coordinate})")
+            return value
+        print(f"Label '{label}' not found in {os.path.basename(file_path)}, using cell {fallback_cell}")
+    value = read_cell(file_path, fallback_cell)
+    print(f"✅ Extracted VAS Balance: {value} THB")
+    return value
@@ -0,0 +1,124 @@
+import os
+import random
+import threading
+import time
+from dotenv import load_dotenv
+from instrumentation import increment
+
+# Retries with exponential backoff and jitter, a time budget per source, and a
+# per-source circuit breaker so a portal that is down fails fast instead of
+# eating the whole run window. Extractors signal failure by returning None
+# (or raising); both count as a failed attempt.
+
+load_dotenv()
+
+class RetryPolicy:
+    def __init__(self, attempts=3, base_delay=5.0, max_delay=60.0, multiplier=2.0, jitter=0.5):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter  # Fraction of the delay randomised, so retries don't line up
+
+    def delay(self, attempt):
+        # Delay after the given (1-based) failed attempt
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+def policy_for(source, retries=None, base_delay=None, max_delay=None):
+    # <SOURCE>_RETRIES, <SOURCE>_RETRY_DELAY and <SOURCE>_RETRY_MAX_DELAY override the
+    # given values (e.g. from the source config), which override the EXTRACT_* defaults.
+    # RETRIES counts retries after the first call: 2 (the default) means up to 3 attempts.
+    prefix = source.upper()
+
+    def setting(name, value, default):
+        fallback = os.getenv(f"EXTRACT_{name}", default) if value is None else value
+        return os.getenv(f"{prefix}_{name}", fallback)
+
+    return RetryPolicy(
+        attempts=int(setting("RETRIES", retries, "2")) + 1,
+        base_delay=float(setting("RETRY_DELAY", base_delay, "5")),
+        max_delay=float(setting("RETRY_MAX_DELAY", max_delay, "60")),
+    )
+
+class CircuitBreaker:
+    # closed: calls go through. open: calls fail fast until reset_timeout has passed.
+    # half-open: one trial call; success closes the breaker, failure opens it again.
+    def __init__(self, name, failure_threshold=3, reset_timeout=900.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            return self.state != "open"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            # A failed half-open trial re-opens the breaker straight away
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                print(f"⚠️ {self.name} circuit opened after {self.failures} failure(s); skipping it for {self.reset_timeout:.0f}s")
+                self.opened_at = self.clock()
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(source):
+    # Breakers live for the whole process so the scheduler remembers a portal is down between runs
+    with _breakers_lock:
+        if source not in _breakers:
+            _breakers[source] = CircuitBreaker(
+                source,
+                failure_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3")),
+                reset_timeout=float(os.getenv("BREAKER_RESET_TIMEOUT", "900")),
+            )
+        return _breakers[source]
+
+def call_with_retry(source, func, budget=None, policy=None, breaker=None, sleep=time.sleep, clock=time.monotonic):
+    # Call func until it returns a value, the attempts or time budget run out, or the breaker opens.
+    policy = policy or policy_for(source)
+    breaker = breaker or get_breaker(source)
+    deadline = None if budget is None else clock() + budget
+    for attempt in range(1, policy.attempts + 1):
+        if not breaker.allow():
+            print(f"❌ {source} circuit is open, not calling the portal.")
+            return None
+        try:
+            value = func()
+        except Exception as e:
+            print(f"❌ {source} attempt {attempt} raised: {e}")
+            value = None
+        if value is not None:
+            breaker.record_success()
+            if attempt > 1:
+                print(f"✅ {source} succeeded on attempt {attempt}.")
+            return value
+        breaker.record_failure()
+        if attempt == policy.attempts or not breaker.allow():
+            break
+        delay = policy.delay(attempt)
+        if deadline is not None and clock() + delay >= deadline:
+            print(f"❌ {source} time budget exhausted after {attempt} attempt(s).")
+            break
+        print(f"Retrying {source} in {delay:.1f}s (attempt {attempt + 1}/{policy.attempts})...")
+        increment("retries", source)
+        sleep(delay)
+    return None
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+# Extracted balances cached on disk, keyed by (source, business date, account), so a
+# re-run for the same business date (manual re-run, failed email, scheduler catch-up)
+# reuses them instead of logging in to the portals again.
+# - Sources marked "final" in sources.json (VAS: the finished prior-day report) are kept for days.
+# - Live balances (CIMB, V2) are reused only for a short window (re-sends), then refetched.
+# Entries are files named by the SHA-256 of their key; the oldest are evicted past
+# RESULT_CACHE_MAX_ENTRIES. RESULT_CACHE_REFRESH=1 (or force_refresh) bypasses the cache.
+
+load_dotenv()
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".result_cache"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "500"))
+FORCE_REFRESH = os.getenv("RESULT_CACHE_REFRESH", "").lower() in ("1", "true", "yes")
+DEFAULT_TTLS = {"final": 7 * 24 * 3600, "live": 900}  # seconds
+
+_lock = threading.Lock()
+
+def is_final(source):
+    # Balances that no longer change once extracted for a business date
+    from extractors import get_registry
+    registered = get_registry().all.get(source)
+    return registered is not None and registered.final
+
+def ttl_for(source):
+    # <SOURCE>_RESULT_TTL overrides the default (seconds; 0 disables caching for the source)
+    default = DEFAULT_TTLS["final" if is_final(source) else "live"]
+    return float(os.getenv(f"{source.upper()}_RESULT_TTL", str(default)))
+
+def account_for(source):
+    # The account a balance belongs to: the source's first configured account (e.g. CIMB's
+    # settlement account), the portal user otherwise
+    from extractors import get_registry
+    registered = get_registry().all.get(source)
+    if registered is not None and registered.accounts:
+        return registered.accounts[0]
+    return os.getenv(f"{source}_USERNAME", "")
+
+def cache_key(source, business_date, account=""):
+    text = json.dumps([source, str(business_date), account or ""])
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def _path(key):
+    return os.path.join(RESULT_CACHE_DIR, f"{key}.json")
+
+def get(source, business_date, account="", now=None):
+    # Cached value, or None when missing or expired
+    path = _path(cache_key(source, business_date, account))
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if (now or time.time()) >= entry["expires_at"]:
+        _remove(path)
+        return None
+    return entry["value"]
+
+def put(source, business_date, value, account="", ttl=None, now=None):
+    ttl = ttl_for(source) if ttl is None else ttl
+    if value is None or ttl <= 0:
+        return False
+    now = now or time.time()
+    entry = {
+        "source": source,
+        "business_date": str(business_date),
+        "account": account or "",
+        "value": value,
+        "fetched_at": now,
+        "expires_at": now + ttl,
+    }
+    path = _path(cache_key(source, business_date, account))
+    with _lock:
+        os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        _evict(now)
+    return True
+
+def invalidate(source, business_date, account=""):
+    _remove(_path(cache_key(source, business_date, account)))
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _evict(now):
+    # Drops expired entries, then the oldest ones beyond the size cap
+    entries = []
+    for name in os.listdir(RESULT_CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(RESULT_CACHE_DIR, name)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            _remove(path)
+            continue
+        if now >= entry["expires_at"]:
+            _remove(path)
+        else:
+            entries.append((entry["fetched_at"], path))
+    entries.sort()
+    for _, path in entries[:max(0, len(entries) - RESULT_CACHE_MAX_ENTRIES)]:
+        _remove(path)
+
+def memoize(source, func, business_date, account=None, force_refresh=False):
+    # Wraps an extractor so it serves the cached balance for business_date when there is one
+    account = account_for(source) if account is None else account
+
+    def cached():
+        if not (force_refresh or FORCE_REFRESH):
+            value = get(source, business_date, account)
+            if value is not None:
+                print(f"✅ {source} balance for {business_date} from result cache: {value}")
+                return value
+        value = func()
+        if value is not None:
+            put(source, business_date, value, account)
+        return value
+    return cached
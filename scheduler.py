@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import pytz
+
+# Event-driven scheduler: computes the next fire time of each cron-like schedule
+# in Asia/Bangkok and sleeps until then instead of polling the clock.
+# - Missed runs (process down at fire time) are caught up once on start, within a grace period.
+# - A job that is still running when it fires again is skipped, never run twice at once.
+# - clock and sleep are injectable so schedules can be tested without waiting.
+
+BANGKOK_TZ = pytz.timezone("Asia/Bangkok")
+MAX_SLEEP = 3600  # Re-check at least hourly in case the host clock jumps
+STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".scheduler_state.json")
+
+_FIELD_RANGES = [
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 6),  # 0 = Sunday, as in cron
+]
+_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+def _parse_field(text, low, high):
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = end = int(part)
+            if step != 1:
+                end = high
+        if high == 6 and end == 7:
+            values.add(0)  # 7 is also Sunday
+            end = 6
+            if start == 7:
+                continue
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Invalid cron field '{text}' (allowed {low}-{high})")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronSchedule:
+    # Standard 5-field cron expression: minute hour day month weekday
+    def __init__(self, expression, tz=BANGKOK_TZ):
+        self.expression = expression.strip()
+        self.tz = tz
+        fields = _ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: '{expression}'")
+        parsed = {name: _parse_field(text, low, high) for text, (name, low, high) in zip(fields, _FIELD_RANGES)}
+        self.minutes = sorted(parsed["minute"])
+        self.hours = sorted(parsed["hour"])
+        self.days = parsed["day"]
+        self.months = parsed["month"]
+        self.weekdays = parsed["weekday"]
+        # Like cron: if both day and weekday are restricted, either one matching is enough
+        self._day_any = fields[2] == "*"
+        self._weekday_any = fields[4] == "*"
+
+    def _day_matches(self, day):
+        if day.month not in self.months:
+            return False
+        day_ok = day.day in self.days
+        weekday_ok = (day.isoweekday() % 7) in self.weekdays
+        if self._day_any or self._weekday_any:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment):
+        # First fire time strictly after moment (an aware datetime), in the schedule's timezone
+        local = moment.astimezone(self.tz).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        day = local.date()
+        for _ in range(366 * 5):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime(day.year, day.month, day.day, hour, minute)
+                        if candidate >= local:
+                            return self.tz.localize(candidate)
+            day += timedelta(days=1)
+        raise ValueError(f"Cron expression never fires: '{self.expression}'")
+
+    def __repr__(self):
+        return f"CronSchedule('{self.expression}')"
+
+class Job:
+    def __init__(self, name, schedule, func):
+        self.name = name
+        self.schedule = CronSchedule(schedule) if isinstance(schedule, str) else schedule
+        self.func = func
+        self.next_run = None
+        self.lock = threading.Lock()
+
+class Scheduler:
+    def __init__(self, jobs, clock=None, sleep=time.sleep, state_path=STATE_PATH,
+                 catchup_grace=timedelta(hours=12), threaded=True):
+        self.jobs = list(jobs)
+        self.clock = clock or (lambda: datetime.now(BANGKOK_TZ))
+        self.sleep = sleep
+        self.state_path = state_path
+        self.catchup_grace = catchup_grace
+        self.threaded = threaded
+        self._state_lock = threading.Lock()
+        self._state = self._load_state()
+        self._stopped = threading.Event()
+        self._plan()
+
+    def _load_state(self):
+        if not self.state_path:
+            return {}
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _record_run(self, job, scheduled_for):
+        with self._state_lock:
+            self._state[job.name] = scheduled_for.isoformat()
+            if not self.state_path:
+                return
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._state, f, indent=2)
+            os.replace(tmp_path, self.state_path)
+
+    def _plan(self):
+        now = self.clock()
+        for job in self.jobs:
+            job.next_run = job.schedule.next_after(now)
+            last_run = self._state.get(job.name)
+            if last_run is None:
+                continue
+            # Only fire times within the grace period are worth catching up; take the latest one
+            since = max(datetime.fromisoformat(last_run), now - self.catchup_grace)
+            missed = job.schedule.next_after(since)
+            if missed > now:
+                continue
+            while (following := job.schedule.next_after(missed)) <= now:
+                missed = following
+            print(f"[scheduler] {job.name}: missed run at {missed:%Y-%m-%d %H:%M}, catching up now.")
+            job.next_run = missed
+
+    def _start(self, job, scheduled_for):
+        if not job.lock.acquire(blocking=False):
+            print(f"[scheduler] {job.name}: previous run still in progress, skipping {scheduled_for:%H:%M} run.")
+            return
+
+        def run():
+            try:
+                print(f"[scheduler] {job.name}: starting run scheduled for {scheduled_for:%Y-%m-%d %H:%M}")
+                job.func()
+            except Exception as e:
+                print(f"[scheduler] {job.name}: run failed: {e}")
+            finally:
+                self._record_run(job, scheduled_for)
+                job.lock.release()
+
+        if self.threaded:
+            threading.Thread(target=run, name=f"job-{job.name}", daemon=True).start()
+        else:
+            run()
+
+    def tick(self):
+        # Start every job that is due; returns seconds until the next fire time
+        now = self.clock()
+        for job in self.jobs:
+            if job.next_run <= now:
+                scheduled_for = job.next_run
+                # Coalesce: several missed fire times of one job give a single run
+                job.next_run = job.schedule.next_after(now)
+                self._start(job, scheduled_for)
+        next_job = min(self.jobs, key=lambda j: j.next_run)
+        delay = (next_job.next_run - self.clock()).total_seconds()
+        return max(0.0, delay), next_job
+
+    def run_forever(self):
+        announced = None
+        while not self._stopped.is_set():
+            delay, next_job = self.tick()
+            if delay > 0 and announced != (next_job.name, next_job.next_run):
+                announced = (next_job.name, next_job.next_run)
+                print(f"[scheduler] Next run: {next_job.name} at {next_job.next_run:%Y-%m-%d %H:%M %Z} (in {delay / 60:.0f} min)")
+            self.sleep(min(delay, MAX_SLEEP))
+
+    def stop(self):
+        self._stopped.set()
+
+def schedules_from_env(default="15 0 * * *"):
+    # REPORT_SCHEDULES: one or more cron expressions separated by ';', e.g. "15 0 * * *; 0 9-18/3 * * 1-5"
+    text = os.getenv("REPORT_SCHEDULES", default)
+    return [expression.strip() for expression in text.split(";") if expression.strip()]
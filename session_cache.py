@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import time
+from cryptography.fernet import Fernet, InvalidToken
+from dotenv import load_dotenv
+
+# Encrypted on-disk cookie cache so a run can skip the login form while the
+# portal session is still valid. Entries are keyed by (source, user) and stored in
+# Selenium's cookie format, so the browser and HTTP backends share one cache.
+# Generate a key once with:
+#   python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
+# and put it in .env as SESSION_CACHE_KEY. Without a key the cache is disabled.
+
+load_dotenv()
+SESSION_CACHE_KEY = os.getenv("SESSION_CACHE_KEY")
+SESSION_CACHE_DIR = os.getenv("SESSION_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".session_cache"))
+SESSION_CACHE_MAX_AGE = float(os.getenv("SESSION_CACHE_MAX_AGE", str(8 * 3600)))  # seconds
+
+def _fernet():
+    if not SESSION_CACHE_KEY:
+        return None
+    return Fernet(SESSION_CACHE_KEY.strip('"').encode())
+
+def _cache_path(source, user):
+    digest = hashlib.sha256(f"{source}:{user}".encode()).hexdigest()[:32]
+    return os.path.join(SESSION_CACHE_DIR, f"{source.lower()}_{digest}.bin")
+
+def _to_cdp_cookie(cookie):
+    # Selenium's get_cookies() format -> CDP Network.setCookies format
+    cdp_cookie = {
+        "name": cookie["name"],
+        "value": cookie["value"],
+        "domain": cookie.get("domain"),
+        "path": cookie.get("path", "/"),
+        "secure": cookie.get("secure", False),
+        "httpOnly": cookie.get("httpOnly", False),
+    }
+    if "expiry" in cookie:
+        cdp_cookie["expires"] = cookie["expiry"]
+    if cookie.get("sameSite") in ("Strict", "Lax", "None"):
+        cdp_cookie["sameSite"] = cookie["sameSite"]
+    return cdp_cookie
+
+def _from_jar_cookie(cookie):
+    # requests/http.cookiejar Cookie -> Selenium's get_cookies() format
+    selenium_cookie = {
+        "name": cookie.name,
+        "value": cookie.value,
+        "domain": cookie.domain,
+        "path": cookie.path or "/",
+        "secure": bool(cookie.secure),
+        "httpOnly": cookie.has_nonstandard_attr("HttpOnly"),
+    }
+    if cookie.expires is not None:
+        selenium_cookie["expiry"] = cookie.expires
+    return selenium_cookie
+
+def _save_cookies(cookies, source, user):
+    fernet = _fernet()
+    if fernet is None or not user:
+        return False
+    try:
+        payload = json.dumps({"saved_at": time.time(), "cookies": cookies}).encode()
+        os.makedirs(SESSION_CACHE_DIR, exist_ok=True)
+        path = _cache_path(source, user)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(fernet.encrypt(payload))
+        os.replace(tmp_path, path)
+        print(f"Saved {source} session to cache.")
+        return True
+    except Exception as e:
+        print(f"Could not save {source} session: {e}")
+        return False
+
+def save_session(driver, source, user):
+    try:
+        cookies = driver.get_cookies()
+    except Exception as e:
+        print(f"Could not save {source} session: {e}")
+        return False
+    return _save_cookies(cookies, source, user)
+
+def save_cookie_jar(jar, source, user):
+    # Same as save_session, for a requests.Session's cookie jar
+    return _save_cookies([_from_jar_cookie(cookie) for cookie in jar], source, user)
+
+def load_cookies(source, user):
+    fernet = _fernet()
+    if fernet is None or not user:
+        return None
+    path = _cache_path(source, user)
+    try:
+        with open(path, "rb") as f:
+            payload = json.loads(fernet.decrypt(f.read()))
+    except FileNotFoundError:
+        return None
+    except (InvalidToken, ValueError) as e:
+        # Wrong key or corrupt file: drop it and log in normally
+        print(f"Discarding unreadable {source} session cache: {e}")
+        clear_session(source, user)
+        return None
+    if time.time() - payload["saved_at"] > SESSION_CACHE_MAX_AGE:
+        clear_session(source, user)
+        return None
+    now = time.time()
+    return [c for c in payload["cookies"] if c.get("expiry", now + 1) > now]
+
+def restore_session(driver, source, user):
+    # Load cached cookies into the browser before the first page load.
+    # Returns True if cookies were restored; the caller still has to check the session is live.
+    cookies = load_cookies(source, user)
+    if not cookies:
+        return False
+    try:
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": [_to_cdp_cookie(c) for c in cookies]})
+        print(f"Restored cached {source} session.")
+        return True
+    except Exception as e:
+        print(f"Could not restore {source} session: {e}")
+        return False
+
+def restore_cookie_jar(jar, source, user):
+    # Load cached cookies into a requests.Session's cookie jar; same contract as restore_session
+    cookies = load_cookies(source, user)
+    if not cookies:
+        return False
+    for cookie in cookies:
+        rest = {"HttpOnly": None} if cookie.get("httpOnly") else {}
+        jar.set(cookie["name"], cookie["value"], domain=cookie.get("domain") or "", path=cookie.get("path", "/"),
+                secure=cookie.get("secure", False), expires=cookie.get("expiry"), rest=rest)
+    print(f"Restored cached {source} session.")
+    return True
+
+def clear_session(source, user):
+    try:
+        os.remove(_cache_path(source, user))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,56 @@
+import os
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+# Shared wait layer: every helper returns as soon as its condition holds,
+# or raises selenium's TimeoutException once the timeout runs out.
+
+# Default timeouts (seconds) per source, overridable with <SOURCE>_WAIT_TIMEOUT in .env
+DEFAULT_TIMEOUTS = {
+    "V2": 20,
+    "VAS": 30,
+    "CIMB": 30,
+}
+POLL_FREQUENCY = 0.2
+
+def timeout_for(source):
+    default = DEFAULT_TIMEOUTS.get(source.upper(), 20)
+    return float(os.getenv(f"{source.upper()}_WAIT_TIMEOUT", default))
+
+def _wait(driver, timeout):
+    return WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY)
+
+def wait_for_element(driver, locator, timeout):
+    return _wait(driver, timeout).until(EC.presence_of_element_located(locator))
+
+def wait_for_visible(driver, locator, timeout):
+    return _wait(driver, timeout).until(EC.visibility_of_element_located(locator))
+
+def wait_for_clickable(driver, locator, timeout):
+    # locator may also be a WebElement that was already found
+    return _wait(driver, timeout).until(EC.element_to_be_clickable(locator))
+
+def wait_for_any(driver, locators, timeout):
+    # Wait until one of several elements shows up; returns (index of the locator, element)
+    def found(d):
+        for index, locator in enumerate(locators):
+            elements = d.find_elements(*locator)
+            if elements:
+                return index, elements[0]
+        return False
+    return _wait(driver, timeout).until(found)
+
+def wait_for_frame(driver, frame, timeout):
+    # Switches into the frame once it is available (frame may be a name, index or locator)
+    return _wait(driver, timeout).until(EC.frame_to_be_available_and_switch_to_it(frame))
+
+def wait_for_url_change(driver, old_url, timeout):
+    return _wait(driver, timeout).until(EC.url_changes(old_url))
+
+def wait_until(driver, condition, timeout):
+    # Generic wait: condition(driver) is polled until it returns something truthy, which is returned
+    return _wait(driver, timeout).until(condition)
+
+def wait_for_staleness(driver, element, timeout):
+    # Wait until element is gone from the DOM, e.g. after its frame reloads
+    return _wait(driver, timeout).until(EC.staleness_of(element))